@@ -1,14 +1,22 @@
 from __future__ import annotations
 import re, os, tempfile
+from operator import itemgetter
 from pathlib import Path
+from datetime import datetime
 from typing import Optional, List, Tuple, Dict, Union
 from dateutil import parser as dtparser
 import shutil
+from contextlib import ExitStack
 
 import pikepdf
 import fitz  # PyMuPDF
-from pdf2image import convert_from_path
 import pytesseract
+from PIL import Image
+
+try:
+    from tesserocr import PyTessBaseAPI
+except ImportError:  # tesserocr is optional; without it pytesseract runs one tesseract process per page
+    PyTessBaseAPI = None
 
 # -------------------------------
 # 1) Helpers: decrypt + text extraction
@@ -26,7 +34,8 @@ def decrypt_to_temp(encrypted_pdf: str, password: Optional[str] = None) -> str:
 
     # Make a unique temp filename to avoid collisions
     with tempfile.NamedTemporaryFile(
-        prefix=src.stem + ".", suffix=".decrypted.tmp.pdf", delete=False
+        prefix=src.stem + ".", suffix=".decrypted.tmp.pdf", delete=False,
+        dir="/dev/shm" if os.path.isdir("/dev/shm") else None,  # tmpfs: never touches disk
     ) as tf:
         tmp_path = Path(tf.name)
 
@@ -74,24 +83,66 @@ def pdf_text_lines(pdf_path: str, max_pages: Optional[int] = None) -> List[str]:
                 lines.extend(s for s in txt.splitlines() if s.strip())
     return lines
 
-def ocr_text_lines(pdf_path: str, dpi: int = 300, lang: str = "eng", max_pages: Optional[int] = None) -> List[str]:
-    """OCR each page (no Ghostscript needed). Requires poppler + Tesseract installed."""
-    images = convert_from_path(pdf_path, dpi=dpi)
-    if max_pages is not None:
-        images = images[:max_pages]
-    lines: List[str] = []
-    for idx, img in enumerate(images, 1):
+# Pages with at least this much selectable text are read directly instead of OCR'd
+OCR_MIN_TEXT_CHARS = 50
+
+def _render_gray(page, dpi: int) -> Image.Image:
+    # Tesseract binarizes internally; 8-bit gray at 200 dpi is a sixth of the RGB 300 dpi bytes
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+
+def _ocr_lines(img: Image.Image, lang: str, api=None) -> List[str]:
+    """OCR one rendered page, through a loaded tesserocr API when given, else pytesseract."""
+    if api is not None:
+        api.SetImage(img)
+        txt = api.GetUTF8Text()
+    else:
         txt = pytesseract.image_to_string(img, lang=lang)
-        lines.extend(s for s in txt.splitlines() if s.strip())
+    return [s for s in txt.splitlines() if s.strip()]
+
+def ocr_text_lines(pdf_path: str, dpi: int = 200, lang: str = "eng", max_pages: Optional[int] = None) -> List[str]:
+    """OCR each page, rendering one page at a time with PyMuPDF. Requires Tesseract installed.
+
+    With tesserocr available the language model is loaded once per document instead of once per page.
+    """
+    lines: List[str] = []
+    with fitz.open(pdf_path) as doc, ExitStack() as stack:
+        api = stack.enter_context(PyTessBaseAPI(lang=lang)) if PyTessBaseAPI is not None else None
+        n = len(doc) if max_pages is None else min(max_pages, len(doc))
+        for i in range(n):
+            lines.extend(_ocr_lines(_render_gray(doc[i], dpi), lang, api))
     return lines
 
-def get_text_lines_smart(encrypted_pdf: str, password: str, lang: str = "eng") -> Tuple[List[str], str]:
-    """Decrypt, try PyMuPDF; if no text found, fall back to OCR."""
+def get_text_lines_smart(encrypted_pdf: str, password: str, lang: str = "eng", source: Optional[dict] = None,
+                         dpi: int = 200) -> Tuple[List[str], str]:
+    """Decrypt, read each page's text with PyMuPDF, and OCR only the pages without enough of it.
+
+    With a source, pages are read one at a time and reading stops as soon as
+    both the due date and the amount can be extracted (usually page 1).
+    """
     dec_path = decrypt_to_temp(encrypted_pdf, password)
-    lines = pdf_text_lines(dec_path)
-    if not any(lines):
-        # Fallback to OCR (can be slow on big PDFs; adjust dpi/lang as needed)
-        lines = ocr_text_lines(dec_path, dpi=300, lang=lang)
+    lines: List[str] = []
+    has_due = has_amount = False
+    with fitz.open(dec_path) as doc, ExitStack() as stack:
+        api = None
+        for i in range(len(doc)):
+            page = doc.load_page(i)
+            txt = page.get_text("text")
+            if len(txt.strip()) >= OCR_MIN_TEXT_CHARS:
+                page_lines = [s for s in txt.splitlines() if s.strip()]
+            else:
+                # scanned page: OCR just this one (slow; adjust dpi/lang as needed)
+                if api is None and PyTessBaseAPI is not None:
+                    api = stack.enter_context(PyTessBaseAPI(lang=lang))
+                page_lines = _ocr_lines(_render_gray(page, dpi), lang, api)
+            lines.extend(page_lines)
+            if source is not None and page_lines:
+                # only the new page is searched, so the check stays linear in the page count
+                found = extract_due_and_amount(page_lines, source)
+                has_due = has_due or bool(found["due_date"])
+                has_amount = has_amount or bool(found["amount"])
+                if has_due and has_amount:
+                    break
     return lines, dec_path
 
 # -------------------------------
@@ -109,12 +160,21 @@ AMOUNT_KEYWORDS_AVOID = [
     r"minimum\s+amount\s+due", r"minimum\s+due"
 ]
 
+# One compiled alternation per keyword group, so each line costs one regex search per group
+DATE_KEYWORDS_RX = re.compile("|".join(DATE_KEYWORDS), re.IGNORECASE)
+AMOUNT_KEYWORDS_PRIMARY_RX = re.compile("|".join(AMOUNT_KEYWORDS_PRIMARY), re.IGNORECASE)
+AMOUNT_KEYWORDS_AVOID_RX = re.compile("|".join(AMOUNT_KEYWORDS_AVOID), re.IGNORECASE)
+
 CURRENCY_SYMS = r"(?:₱|\bPHP\b|(?<!\S)Php)"
 AMOUNT_NUM = r"(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{2})?"
 AMOUNT_RX = re.compile(rf"{CURRENCY_SYMS}?\s*({AMOUNT_NUM})", re.IGNORECASE)
 
-def normalize_amount(s: str) -> Optional[float]:
-    m = AMOUNT_RX.search(s)
+CURRENCY_RX = re.compile(CURRENCY_SYMS, re.IGNORECASE)
+
+# (amount, score, context) candidates rank by score, then amount
+_BY_SCORE_THEN_AMOUNT = itemgetter(1, 0)
+
+def _normalize_from_match(m: Optional[re.Match]) -> Optional[float]:
     if not m:
         return None
     num = m.group(1).replace(",", "")
@@ -123,9 +183,51 @@ def normalize_amount(s: str) -> Optional[float]:
     except ValueError:
         return None
 
+def normalize_amount(s: str) -> Optional[float]:
+    return _normalize_from_match(AMOUNT_RX.search(s))
+
+# Common bill date shapes, tried with strptime before the (much slower) fuzzy dateutil parse
+# Numbers are bounded by non-digits so a date is never read out of a longer number
+# (a card or reference number, or the year of '2025/10/05' taken as a day)
+_DATE_RX = re.compile(
+    r"(?<!\d)(\d{4}-\d{1,2}-\d{1,2})(?!\d)"
+    r"|(?<!\d)(\d{4}[/.]\d{1,2}[/.]\d{1,2})(?!\d)"
+    r"|(?<!\d)(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})(?!\d)"
+    r"|([A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4})(?!\d)"
+    r"|(?<!\d)(\d{1,2}\s+[A-Za-z]{3,9}\.?,?\s+\d{4})(?!\d)"
+)
+# Month-first before day-first, matching the order dateutil is tried in below
+_DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%m/%d/%Y", "%m/%d/%y", "%d/%m/%Y", "%d/%m/%y",
+    "%b %d %Y", "%B %d %Y",
+    "%d %b %Y", "%d %B %Y",
+)
+_HAS_DIGIT_RX = re.compile(r"\d")
+
+def _parse_date_fast(s: str) -> Optional[str]:
+    for m in _DATE_RX.finditer(s):
+        txt = m.group(0)
+        if m.group(2):  # year-first with slashes or dots reads as ISO
+            txt = txt.replace("/", "-").replace(".", "-")
+        elif not m.group(1):  # leave ISO dashes alone; fold the rest onto the formats above
+            txt = " ".join(txt.replace(",", "").replace(".", "").replace("-", "/").split())
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(txt, fmt).date().isoformat()
+            except ValueError:
+                continue
+    return None
+
 def parse_date_any(s: str) -> Optional[str]:
     """Return ISO date (YYYY-MM-DD) if parsable."""
     s = s.strip()
+    # a date needs at least a day or year number; most lines near a keyword have none
+    if not _HAS_DIGIT_RX.search(s):
+        return None
+    fast = _parse_date_fast(s)
+    if fast:
+        return fast
     # Try several liberal parses (handles 'Oct 15, 2025', '15 Oct 2025', '10/15/2025')
     for dayfirst in (False, True):
         try:
@@ -168,9 +270,8 @@ def extract_due_and_amount(lines: List[str], source) -> Dict[str, Optional[str]]
     amount_regex = re.compile(source.get("amount_regex"), re.IGNORECASE) if source.get("amount_regex") else None
 
     # Pass 1: Due Date
-    print(lines)
     for i, line in enumerate(lines):
-        if match_any(line, due_date_regex if due_date_regex else DATE_KEYWORDS):
+        if match_any(line, due_date_regex or DATE_KEYWORDS_RX):
             # Try same line first
             dd = parse_date_any(line)
             if dd:
@@ -189,34 +290,34 @@ def extract_due_and_amount(lines: List[str], source) -> Dict[str, Optional[str]]
 
     # Pass 2: Amounts - collect candidates with simple scoring
     candidates: List[Tuple[float, int, str]] = []  # (amount, score, context)
+    # one amount search per line, shared by the same-line and look-ahead checks
+    amounts = [_normalize_from_match(AMOUNT_RX.search(line)) for line in lines]
     for i, line in enumerate(lines):
+        am = amounts[i]
         # Skip minimum due if possible
-        if match_any(line, AMOUNT_KEYWORDS_AVOID):
-            am = normalize_amount(line)
+        if match_any(line, AMOUNT_KEYWORDS_AVOID_RX):
             if am is not None:
                 # Lower score for minimum due
                 candidates.append((am, 1, line))
             continue
 
-        pri_hit = match_any(line, amount_regex if amount_regex else AMOUNT_KEYWORDS_PRIMARY)
-        am = normalize_amount(line)
+        pri_hit = match_any(line, amount_regex or AMOUNT_KEYWORDS_PRIMARY_RX)
         if am is not None:
             score = 3 if pri_hit else 2
             # small bonus if currency symbol present
-            if re.search(CURRENCY_SYMS, line, flags=re.IGNORECASE):
+            if CURRENCY_RX.search(line):
                 score += 1
             candidates.append((am, score, line))
 
         # Look-ahead: amount on next line after a primary keyword
         if pri_hit and i + 1 < len(lines):
-            am2 = normalize_amount(lines[i + 1])
+            am2 = amounts[i + 1]
             if am2 is not None:
                 candidates.append((am2, 4, lines[i] + " | " + lines[i + 1]))
 
     if candidates:
         # Pick highest score; if tie, pick the largest amount (credit card/utility “Total Due” is usually max)
-        candidates.sort(key=lambda t: (t[1], t[0]), reverse=True)
-        amount_value, _, amount_source = candidates[0]
+        amount_value, _, amount_source = max(candidates, key=_BY_SCORE_THEN_AMOUNT)
 
     return {
         "due_date": due_date_iso,                          # e.g., "2025-10-15"
@@ -228,7 +329,7 @@ def extract_due_and_amount(lines: List[str], source) -> Dict[str, Optional[str]]
 # 3) One-call entry point
 # -------------------------------
 def extract_bill_fields(encrypted_pdf: str, password: str, source: list, lang: str = "eng") -> Dict[str, Optional[str]]:
-    lines, dec_path = get_text_lines_smart(encrypted_pdf, password, lang=lang)
+    lines, dec_path = get_text_lines_smart(encrypted_pdf, password, lang=lang, source=source)
     out = extract_due_and_amount(lines, source)
     # Clean up decrypted temp file
     try:
@@ -2,22 +2,14 @@ from __future__ import annotations
 import re, os, tempfile
 from pathlib import Path
 from typing import Optional, List, Tuple, Dict, Union
-from dateutil import parser as dtparser
 import shutil
 
-import pikepdf
-
-import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from itertools import repeat
 from decimal import Decimal
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import (
-    PdfPipelineOptions,
-    TesseractCliOcrOptions,
-)
-from docling.document_converter import DocumentConverter, PdfFormatOption
 from utils.table_parser import extract_after_header
-from decimal import Decimal, ROUND_HALF_EVEN
 import unicodedata
 
 # -------------------------------
@@ -30,6 +22,9 @@ def decrypt_to_temp(encrypted_pdf: str, password: Optional[str] = None) -> str:
     - If the file is encrypted and no/incorrect password is provided, raises ValueError.
     Note: this does NOT bypass password protection — you must have the password.
     """
+    # pikepdf and docling are imported where used, so parse_money/parse_date/extract_fields load light
+    import pikepdf
+
     src = Path(encrypted_pdf)
     if not src.exists():
         raise FileNotFoundError(f"Input file not found: {encrypted_pdf}")
@@ -40,20 +35,28 @@ def decrypt_to_temp(encrypted_pdf: str, password: Optional[str] = None) -> str:
     ) as tf:
         tmp_path = Path(tf.name)
 
+    def _write_first_page(pdf) -> bool:
+        """Save page 1 unencrypted to tmp_path; False when the source can be read as is."""
+        if len(pdf.pages) == 1:
+            if not pdf.is_encrypted:
+                return False
+            pdf.save(str(tmp_path))  # saving drops the encryption
+        else:
+            new_pdf = pikepdf.Pdf.new()
+            new_pdf.pages.append(pdf.pages[0])
+            new_pdf.save(str(tmp_path))
+        return True
+
     try:
         # Try opening. If password is provided, pass it; otherwise try without password.
         if password is None:
             # If the file is encrypted this will raise PasswordError
             with pikepdf.open(str(src)) as pdf:
-                new_pdf = pikepdf.Pdf.new()
-                new_pdf.pages.append(pdf.pages[0])
-                new_pdf.save(str(tmp_path))
+                copied = _write_first_page(pdf)
         else:
             try:
                 with pikepdf.open(str(src), password=password) as pdf:
-                    new_pdf = pikepdf.Pdf.new()
-                    new_pdf.pages.append(pdf.pages[0])
-                    new_pdf.save(str(tmp_path))
+                    copied = _write_first_page(pdf)
             except pikepdf.PasswordError:
                 # Give a clearer, higher-level error
                 raise ValueError("PDF is encrypted and the provided password is incorrect.")
@@ -73,13 +76,22 @@ def decrypt_to_temp(encrypted_pdf: str, password: Optional[str] = None) -> str:
             pass
         raise
 
+    if not copied:
+        # an unencrypted one-page PDF is already what OCR needs
+        tmp_path.unlink(missing_ok=True)
+        return str(src)
     return str(tmp_path)
 
-def get_text_from_pdf(pdf_path: str, lang: str = "eng") -> str:
-    """
-    Use OCR to extract text from all pages of the PDF.
-    Returns the extracted text as a single string.
-    """
+@lru_cache(maxsize=1)
+def _get_converter() -> DocumentConverter:
+    """Build the OCR DocumentConverter once; its setup costs far more than OCR of a one-page bill."""
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import (
+        PdfPipelineOptions,
+        TesseractCliOcrOptions,
+    )
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
     pipeline_options = PdfPipelineOptions()
     pipeline_options.do_ocr = True
     pipeline_options.do_table_structure = False
@@ -87,17 +99,22 @@ def get_text_from_pdf(pdf_path: str, lang: str = "eng") -> str:
     ocr_options = TesseractCliOcrOptions(force_full_page_ocr=True)
     pipeline_options.ocr_options = ocr_options
 
-    converter = DocumentConverter(
+    return DocumentConverter(
         format_options={
             InputFormat.PDF: PdfFormatOption(
                 pipeline_options=pipeline_options,
             )
         }
     )
-    result = converter.convert(pdf_path)
-    text = result.document.export_to_markdown()
 
-    return text
+def get_text_from_pdf(pdf_path: str, lang: str = "eng") -> str:
+    """
+    Use OCR to extract text from all pages of the PDF.
+    Returns the extracted text as a single string.
+    """
+    result = _get_converter().convert(pdf_path)
+    return result.document.export_to_markdown()
+
 # -------------------------------
 # 2) Parsing logic (Due Date & Amount)
 # -------------------------------
@@ -120,41 +137,82 @@ _MONEY_RE = re.compile(
     (?P<suf>CR|DR)?        # optional CR/DR
     \s*$
     """,
-    re.VERBOSE
+    re.VERBOSE | re.ASCII  # after NFKC, digits are ASCII; ₱ still matches as a literal
 )
 
+def _plain_cents(s: str):
+    """Integer cents for a bare ASCII amount such as '13,927.33' or '850', else None.
+
+    Accepts exactly what _MONEY_RE accepts without sign, currency or CR/DR, so the
+    common OCR output skips NFKC normalization and the full regex.
+    """
+    if not s.isascii():
+        return None
+    whole, dot, frac = s.partition(".")
+    if dot and not (1 <= len(frac) <= 2 and frac.isdigit()):
+        return None
+    groups = whole.split(",")
+    if not all(g.isdigit() for g in groups):
+        return None
+    if len(groups) > 1 and not (len(groups[0]) <= 3 and all(len(g) == 3 for g in groups[1:])):
+        return None
+    return int("".join(groups)) * 100 + int(frac.ljust(2, "0") if dot else "0")
+
+# Compiled once at import; extract_fields calls the bound .search directly
 PATTERNS = {
-    "total_balance": [
-        r"(?i)total\s+account\s+balance\s+([\d,]+\.\d{2})",
-        r"TOTAL AMOUNT DUE[\sA-Z]*([0-9][0-9,]*\.\d{2})"],
-    "due_date": [
-        r"(?i)(?:payment\s+)?due\s+date\s+(\d{1,2}\s+\w+\s+\d{4})",
-        r"PAYMENT\s+DUE\s+DATE\b[^\n\r]*[\r\n]+([0-9]{1,2}\s+[A-Za-z]{3,9}\s+[0-9]{4})"],
-    "min_payment": [
-        r"(?i)minimum\s+payment\s+([\d,]+\.\d{2})",
-        r"MINIMUM AMOUNT DUE[\sA-Z]*([0-9][0-9,]*\.\d{2})"]
+    key: [re.compile(p, re.IGNORECASE | re.DOTALL) for p in patterns]
+    for key, patterns in {
+        "total_balance": [
+            r"(?i)total\s+account\s+balance\s+([\d,]+\.\d{2})",
+            r"TOTAL AMOUNT DUE[\sA-Z]*([0-9][0-9,]*\.\d{2})"],
+        "due_date": [
+            r"(?i)(?:payment\s+)?due\s+date\s+(\d{1,2}\s+\w+\s+\d{4})",
+            r"PAYMENT\s+DUE\s+DATE\b[^\n\r]*[\r\n]+([0-9]{1,2}\s+[A-Za-z]{3,9}\s+[0-9]{4})"],
+        "min_payment": [
+            r"(?i)minimum\s+payment\s+([\d,]+\.\d{2})",
+            r"MINIMUM AMOUNT DUE[\sA-Z]*([0-9][0-9,]*\.\d{2})"],
+    }.items()
 }
 
 # 2) NEW: Markdown-like table row matcher for the data row (4 cells).
 #    We don't rely on the header text being perfect; we match any row of 4 cells following a header line.
-TABLE_ROW = re.compile(
-    rf"""
-    ^\|\s*(?P<total_due>[\s₱P\(\)\d,\.]+?)\s*\|
-      \s*(?P<min_due>[\s₱P\(\)\d,\.]+?)\s*\|
-      \s*(?P<payment_due>{DATE_ANY})\s*\|
-      \s*(?P<amount_paid>[\s₱P\(\)\d,\.]*)\|?
-    """,
-    re.IGNORECASE | re.VERBOSE | re.MULTILINE,
-)
+#    Rows are split on "|" and each cell checked on its own, so malformed rows cannot backtrack.
+_MONEY_CELL = re.compile(r"[\s₱P\(\)\d,\.]+", re.IGNORECASE)
+_DATE_CELL = re.compile(DATE_ANY, re.IGNORECASE)
+
+def _find_table_row(text: str) -> Optional[Dict[str, str]]:
+    for line in text.splitlines():
+        if not line.startswith("|"):
+            continue
+        cells = line.split("|")
+        if len(cells) < 5:  # leading "" + three closed cells + the amount-paid cell
+            continue
+        total_due, min_due, payment_due = (c.strip() for c in cells[1:4])
+        if (_MONEY_CELL.fullmatch(total_due) and _MONEY_CELL.fullmatch(min_due)
+                and _DATE_CELL.fullmatch(payment_due)):
+            return {
+                "total_due": total_due,
+                "min_due": min_due,
+                "payment_due": payment_due,
+                "amount_paid": cells[4].strip(),
+            }
+    return None
+
+# Classifies a date string so parse_date calls strptime once with the right format
+_DATE_SHAPE = re.compile(r"^(?:(?P<mdy>[A-Za-z]+) \d{1,2}, \d{4}|\d{1,2} (?P<dmy>[A-Za-z]+) \d{4})$")
 
 def parse_date(s: str):
     s = " ".join(s.split())
-    # Try multiple common OCR-safe formats
-    fmts = ("%B %d, %Y", "%b %d, %Y", "%d %b %Y", "%d %B %Y")
-    for fmt in fmts:
+    # title() helps when OCR shouts (e.g., "AUGUST 28, 2025")
+    t = s.title()
+    m = _DATE_SHAPE.match(t)
+    if m:
+        if m["mdy"]:
+            fmt = "%b %d, %Y" if len(m["mdy"]) == 3 else "%B %d, %Y"
+        else:
+            fmt = "%d %b %Y" if len(m["dmy"]) == 3 else "%d %B %Y"
         try:
-            # title() helps when OCR shouts (e.g., "AUGUST 28, 2025")
-            return datetime.strptime(s.title(), fmt).date()
+            return datetime.strptime(t, fmt).date()
         except ValueError:
             pass
     raise ValueError(f"Unrecognized date format: {s!r}")
@@ -171,9 +229,13 @@ def parse_money(s: str, *, return_cents: bool = False):
     if not s:
         return None
 
+    cents = _plain_cents(s)
+    if cents is not None:
+        return cents if return_cents else Decimal(cents).scaleb(-2)
+
     # Normalize weird spaces, etc.
     s = unicodedata.normalize("NFKC", s)
-    # Quick paren-neg check (e.g., "(1,234.56)")
+
     paren_neg = s.startswith("(") and s.endswith(")")
     if paren_neg:
         s = s[1:-1].strip()
@@ -183,39 +245,17 @@ def parse_money(s: str, *, return_cents: bool = False):
         return None
 
     sign = m.group("sign") or ""
-    num = m.group("num").replace(",", "")
     suf = (m.group("suf") or "").upper()
+    # the regex allows at most two decimals, so whole cents are exact and need no rounding
+    cents = int(m.group("num").replace(",", "")) * 100 + int((m.group(4) or "").ljust(2, "0"))
 
-    # Build Decimal value safely
-    # m.group(4) is the optional decimal digits captured by the inner group
-    # But simpler: use the full matched 'num' + optional fraction we already captured in text `s`
-    # Here we reconstruct explicitly:
-    if "." in m.group(0):
-        # Already has decimals in the source; keep as-is from num + trailing part
-        # But safer to just read from num and the optional captured decimals:
-        # Extract the fractional from the original string after removing commas is tricky,
-        # so we directly use num (integer part) and group(4) as fractional if present.
-        frac = m.group(4)
-        q = Decimal(num + (("." + frac) if frac else ""))
-    else:
-        q = Decimal(num)
-
-    # Determine negativity
-    is_credit_negative = (suf == "CR")
-    is_debit_positive  = (suf == "DR")
-    negative = paren_neg or (sign == "-") or is_credit_negative
-    positive = (sign == "+") or is_debit_positive
-
-    # If both flags set, negative wins only if explicitly negative and not DR
-    if negative and not is_debit_positive:
-        q = -q
-
-    # Round/quantize to 2 dp
-    q = q.quantize(Decimal("0.01"), rounding=ROUND_HALF_EVEN)
+    # parentheses, a minus or CR make it negative unless it is marked DR
+    if (paren_neg or sign == "-" or suf == "CR") and suf != "DR":
+        cents = -cents
 
     if return_cents:
-        return int((q * 100).to_integral_value(rounding=ROUND_HALF_EVEN))
-    return q
+        return cents
+    return Decimal(cents).scaleb(-2)
 
 def extract_fields(text: str) -> dict:
     # First try the brute-force method
@@ -226,7 +266,7 @@ def extract_fields(text: str) -> dict:
         value = None
         # Try each pattern until something matches
         for pattern in patterns:
-            m = re.search(pattern, text, flags=re.IGNORECASE | re.DOTALL)
+            m = pattern.search(text)
             if m:
                 value = m.group(1)
                 break  # stop at first valid match
@@ -234,8 +274,9 @@ def extract_fields(text: str) -> dict:
         if value is None:
             none_count += 1
     
-    if none_count == 0:
-        return {
+    # The due date plus one amount is enough to trust this layout; the other layouts rescan the whole text
+    if b["due_date"] is not None and (b["total_balance"] is not None or b["min_payment"] is not None):
+        out = {
             "customer_number": None,  # not present in this layout
             "statement_date": None,   # not present in this layout
             "credit_limit": None,     # not present in this layout
@@ -244,11 +285,21 @@ def extract_fields(text: str) -> dict:
             "payment_due_date": parse_date(b["due_date"]),
             "source_layout": "string_strict_sequence",
         }
+        if none_count:
+            # one amount was smudged: borrow just that field from the header block, if there is one
+            try:
+                hdr = extract_after_header(text)
+            except ValueError:
+                hdr = None
+            if hdr:
+                for field in ("total_amount_due", "minimum_amount_due"):
+                    if out[field] is None:
+                        out[field] = parse_money(hdr.get(field))
+        return out
 
     # Second try the markdown/table row layout
-    t = TABLE_ROW.search(text)
-    if t:
-        d = t.groupdict()
+    d = _find_table_row(text)
+    if d:
         return {
             "customer_number": None,  # not present in this layout
             "statement_date": None,   # not present in this layout
@@ -277,6 +328,9 @@ def extract_bill_fields(encrypted_pdf: str, password: str, lang: str = "eng") ->
     print(text)
     out = extract_fields(text)
     print(out)
+    if dec_path == str(Path(encrypted_pdf)):
+        # read in place: there is no temp copy to move back
+        return out
     # Clean up decrypted temp file
     try:
         shutil.move(dec_path, encrypted_pdf)
@@ -287,6 +341,21 @@ def extract_bill_fields(encrypted_pdf: str, password: str, lang: str = "eng") ->
         pass
     return out
 
+def extract_bill_fields_batch(
+    items: List[Tuple[str, Optional[str]]], lang: str = "eng", max_workers: Optional[int] = None
+) -> List[Dict[str, Optional[str]]]:
+    """
+    Run extract_bill_fields for many (encrypted_pdf, password) pairs across worker processes.
+    Each worker builds its DocumentConverter once (see _get_converter) and reuses it for every
+    bill it is handed, so OCR of a month's bills scales with the number of cores.
+    Results come back in input order; the first failure is re-raised.
+    """
+    if not items:
+        return []
+    paths, passwords = zip(*items)
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as ex:
+        return list(ex.map(extract_bill_fields, paths, passwords, repeat(lang, len(paths))))
+
 def main():
     result = extract_bill_fields("../temp_attachments/BPI Rewards - February 2026.pdf", password="19971020", lang="eng")
     #print(result)
@@ -1,48 +1,73 @@
 import re
 from datetime import datetime
+from operator import itemgetter
 from typing import Dict, List, Optional
 
+# All six labels on one line, in any order. Multiline-anchored so a single search over the
+# whole text finds the header line; [^\S\n] keeps each label from spanning a line break.
+_HEADER_LABELS = ("CUSTOMER NUMBER", "STATEMENT DATE", "CREDIT LIMIT",
+                  "TOTAL AMOUNT DUE", "MINIMUM AMOUNT DUE", "PAYMENT DUE DATE")
 HEADER_ANY_ORDER = re.compile(
-    r"""(?i)(?=.*\bCUSTOMER\s+NUMBER\b)(?=.*\bSTATEMENT\s+DATE\b)(?=.*\bCREDIT\s+LIMIT\b)(?=.*\bTOTAL\s+AMOUNT\s+DUE\b)(?=.*\bMINIMUM\s+AMOUNT\s+DUE\b)(?=.*\bPAYMENT\s+DUE\s+DATE\b)"""
+    "(?im)^" + "".join(r"(?=[^\n]*\b" + r"[^\S\n]+".join(label.split()) + r"\b)" for label in _HEADER_LABELS)
 )
 
-CUSTOMER_NO   = re.compile(r"\b\d{2,}(?:-\d+){3,}\b")
-MONEY_STRICT  = re.compile(r"(?<![\dA-Za-z])(?:\d{1,3}(?:,\d{3})+(?:\.\d{2})?|\d+\.\d{2})(?![\dA-Za-z])")
+# OCR'd numbers and month names are ASCII; re.ASCII keeps \d, \s and \b to plain table lookups
+CUSTOMER_NO   = re.compile(r"\b\d{2,}(?:-\d+){3,}\b", re.ASCII)
+MONEY_STRICT  = re.compile(r"(?<![\dA-Za-z])(?:\d{1,3}(?:,\d{3})+(?:\.\d{2})?|\d+\.\d{2})(?![\dA-Za-z])", re.ASCII)
 DATE_CAND     = re.compile(r"""(?ix)
     (?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec|January|February|March|April|
        June|July|August|September|October|November|December)
     [\s\-]+\d{1,2},?[\s\-]+\d{4}
     |
     \d{1,2}[\s\-]+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[\s\-]+\d{4}
-""")
+""", re.ASCII)
+
+_WS = re.compile(r"\s+")
 
 DATE_FORMATS = ("%B %d, %Y", "%b %d, %Y", "%d %b %Y", "%d-%b-%Y", "%B %d %Y", "%b %d %Y")
 
+# Picks the one DATE_FORMATS entry a string can match, so parse_date_safe calls strptime once
+_DATE_SHAPE = re.compile(
+    r"^(?:(?P<mdy>[A-Za-z]+) \d{1,2}(?P<comma>,?) \d{4}|\d{1,2}(?P<sep>[ -])[A-Za-z]{3}(?P=sep)\d{4})$"
+)
+
 def parse_date_safe(s: str) -> Optional[datetime]:
-    s = re.sub(r"\s+", " ", s.strip().replace("Sept", "Sep"))
-    for fmt in DATE_FORMATS:
-        try:
-            return datetime.strptime(s, fmt)
-        except ValueError:
-            pass
-    return None
+    s = _WS.sub(" ", s.strip().replace("Sept", "Sep"))
+    m = _DATE_SHAPE.match(s)
+    if not m:
+        return None
+    if m["mdy"]:
+        fmt = ("%b" if len(m["mdy"]) == 3 else "%B") + " %d" + m["comma"] + " %Y"
+    else:
+        fmt = "%d{0}%b{0}%Y".format(m["sep"])
+    try:
+        return datetime.strptime(s, fmt)
+    except ValueError:
+        return None
 
 def extract_after_header(text: str, max_lines: int = 12) -> Dict[str, str]:
-    lines = text.splitlines()
-
     # 1) find header
-    hdr_idx = None
-    for i, ln in enumerate(lines):
-        if HEADER_ANY_ORDER.match(" ".join(ln.strip().split())):
-            hdr_idx = i
-            break
-    if hdr_idx is None:
+    hdr = HEADER_ANY_ORDER.search(text)
+    if hdr is None:
         raise ValueError("Header not found (any order).")
+    # walk max_lines newlines forward and slice just that region, so neither the
+    # rest of the document nor its lines are copied
+    start = text.find("\n", hdr.start())
+    if start == -1:
+        lines = []
+    else:
+        end = start
+        for _ in range(max_lines):
+            end = text.find("\n", end + 1)
+            if end == -1:
+                end = len(text)
+                break
+        lines = text[start + 1:end].split("\n")
 
     # 2) collect a generous block AFTER header (do NOT stop on blank lines)
     stop_markers = ("| Previous", "## ")
     block: List[str] = []
-    for ln in lines[hdr_idx + 1 :]:
+    for ln in lines:
         if any(ln.strip().startswith(m) for m in stop_markers):
             break
         block.append(ln)                 # include blanks; we’ll normalize later
@@ -50,60 +75,45 @@ def extract_after_header(text: str, max_lines: int = 12) -> Dict[str, str]:
             break
 
     # Normalize whitespace
-    blob = " ".join(seg.strip() for seg in block if seg is not None)
-    blob = re.sub(r"\s{2,}", " ", blob).strip()
+    blob = _WS.sub(" ", " ".join(seg.strip() for seg in block if seg is not None)).strip()
 
     # 3) customer number
     cm = CUSTOMER_NO.search(blob)
     customer_number = cm.group(0) if cm else ""
 
     # 4) dates → chronological: first = statement_date, last = payment_due
-    date_strs = [m.group(0) for m in DATE_CAND.finditer(blob)]
-    parsed = [(ds, parse_date_safe(ds)) for ds in date_strs]
-    parsed = [(ds, dt) for ds, dt in parsed if dt]
-    seen = set()
-    uniq = []
-    for ds, dt in parsed:
-        key = (dt.year, dt.month, dt.day)
-        if key not in seen:
-            seen.add(key)
-            uniq.append((ds, dt))
-    uniq.sort(key=lambda x: x[1])
-    statement_date = uniq[0][0] if uniq else ""
-    payment_due    = uniq[-1][0] if len(uniq) >= 2 else ""
+    # first spelling seen for each distinct day; only the earliest and latest are needed
+    first_by_day = {}
+    for m in DATE_CAND.finditer(blob):
+        ds = m.group(0)
+        dt = parse_date_safe(ds)
+        if dt:
+            first_by_day.setdefault(dt.date(), ds)
+    statement_date = first_by_day[min(first_by_day)] if first_by_day else ""
+    payment_due    = first_by_day[max(first_by_day)] if len(first_by_day) >= 2 else ""
 
     # 5) money: search AFTER the customer number; if fewer than 3 amounts, widen window
+    # dict.fromkeys dedupes while keeping encounter order
     search_text = blob[cm.end():] if cm else blob
-    money_vals = [m.group(0) for m in MONEY_STRICT.finditer(search_text)]
+    unique_vals = list(dict.fromkeys(m.group(0) for m in MONEY_STRICT.finditer(search_text)))
 
     # Fallback: if <3 found, search the whole post-header block
-    if len(set(money_vals)) < 3:
-        money_vals = [m.group(0) for m in MONEY_STRICT.finditer(blob)]
+    if len(unique_vals) < 3 and cm:
+        unique_vals = list(dict.fromkeys(m.group(0) for m in MONEY_STRICT.finditer(blob)))
 
     # Take first 3 distinct tokens in encounter order
-    distinct = []
-    seen_m = set()
-    for m in money_vals:
-        if m not in seen_m:
-            seen_m.add(m)
-            distinct.append(m)
-        if len(distinct) == 3:
-            break
+    distinct = unique_vals[:3]
 
-    def m2f(s: str) -> float:
-        return float(s.replace(",", ""))
+    # smallest = minimum due, largest = credit limit, runner-up = total due;
+    # each token is converted to a float once
+    vals_sorted = [tok for _, tok in sorted(((float(tok.replace(",", "")), tok) for tok in distinct), key=itemgetter(0))]
 
     credit_limit = total_due = min_due = ""
-    if len(distinct) == 3:
-        lo, mid, hi = sorted(distinct, key=m2f)
-        min_due, total_due, credit_limit = lo, mid, hi
-    else:
-        vals_sorted = sorted(distinct, key=m2f) if distinct else []
-        if vals_sorted:
-            min_due = vals_sorted[0]
-            credit_limit = vals_sorted[-1]
-            if len(vals_sorted) >= 2:
-                total_due = vals_sorted[-2]
+    if vals_sorted:
+        min_due = vals_sorted[0]
+        credit_limit = vals_sorted[-1]
+        if len(vals_sorted) >= 2:
+            total_due = vals_sorted[-2]
 
     if payment_due or total_due:
         return {
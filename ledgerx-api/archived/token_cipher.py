@@ -1,9 +1,24 @@
 # token_cipher.py
 import json
 import os
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from cryptography.fernet import Fernet, InvalidToken
 
+
+@lru_cache(maxsize=4)
+def _load_keys(env_var: str) -> Tuple[str, Dict[str, Fernet]]:
+    """Parse the key config and build its Fernets once per env var; Fernet objects are safe to share."""
+    raw = os.getenv(env_var)
+    if not raw:
+        raise RuntimeError(f"{env_var} not set")
+    cfg = json.loads(raw)
+    fernets = {
+        kid: Fernet(key.encode() if isinstance(key, str) else key)
+        for kid, key in cfg["keys"].items()
+    }
+    return cfg["current"], fernets
+
 class TokenCipher:
     """
     Simple AEAD wrapper around Fernet with key rotation.
@@ -11,24 +26,20 @@ class TokenCipher:
     """
 
     def __init__(self, env_var: str = "LEDGERX_KMS_KEYS") -> None:
-        raw = os.getenv(env_var)
-        if not raw:
-            raise RuntimeError(f"{env_var} not set")
-        cfg = json.loads(raw)
-        self.current_kid: str = cfg["current"]
-        self._fernets = {
-            kid: Fernet(key.encode() if isinstance(key, str) else key)
-            for kid, key in cfg["keys"].items()
-        }
+        self.current_kid, self._fernets = _load_keys(env_var)
         if self.current_kid not in self._fernets:
             raise RuntimeError(f"current kid {self.current_kid} missing in keys")
+        self._current_fernet = self._fernets[self.current_kid]
+        # Fallback order for rows without a usable kid: most rows use the current key
+        self._ordered_fernets = [self._current_fernet] + [
+            f for kid, f in self._fernets.items() if kid != self.current_kid
+        ]
 
     def encrypt(self, plaintext: bytes) -> Tuple[str, bytes]:
         """
         Returns (kid, ciphertext). Store both in DB.
         """
-        f = self._fernets[self.current_kid]
-        ct = f.encrypt(plaintext)  # includes nonce & timestamp, AEAD protected
+        ct = self._current_fernet.encrypt(plaintext)  # includes nonce & timestamp, AEAD protected
         return self.current_kid, ct
 
     def decrypt(self, kid: Optional[str], ciphertext: bytes) -> bytes:
@@ -37,11 +48,12 @@ class TokenCipher:
         tries all known keys (handy for legacy rows).
         """
         # Preferred: use the kid
-        if kid and kid in self._fernets:
-            return self._fernets[kid].decrypt(ciphertext)
-        # Fallback: try all keys (for legacy rows without kid)
+        f = self._fernets.get(kid) if kid else None
+        if f is not None:
+            return f.decrypt(ciphertext)
+        # Fallback: try all keys, current first (for legacy rows without kid)
         last_err = None
-        for f in self._fernets.values():
+        for f in self._ordered_fernets:
             try:
                 return f.decrypt(ciphertext)
             except InvalidToken as e:
@@ -51,9 +63,19 @@ class TokenCipher:
     def needs_rotation(self, kid: Optional[str]) -> bool:
         return kid != self.current_kid
 
-    def rotate(self, ciphertext: bytes) -> Tuple[str, bytes]:
+    def rotate(self, ciphertext: bytes, kid: Optional[str] = None) -> Tuple[str, bytes]:
         """
         Decrypt with any key, re-encrypt with current key. Return (new_kid, new_ct).
+        Pass the stored kid when known: it picks the key directly, and a row already
+        on the current key is returned unchanged.
         """
-        pt = self.decrypt(kid=None, ciphertext=ciphertext)
+        if kid == self.current_kid:
+            return kid, ciphertext
+        pt = self.decrypt(kid=kid, ciphertext=ciphertext)
         return self.encrypt(pt)
+
+
+@lru_cache(maxsize=1)
+def default_cipher() -> TokenCipher:
+    """Shared TokenCipher for LEDGERX_KMS_KEYS, so request handlers need not build their own."""
+    return TokenCipher()
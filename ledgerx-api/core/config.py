@@ -1,10 +1,19 @@
 from __future__ import annotations
 
-import json
+import os
+from functools import cached_property, lru_cache
 from pathlib import Path
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional
+    from json import loads as json_loads
+
+# Paths whose directories were already created in this process
+_PREPARED: set[Path] = set()
+
 class Settings(BaseSettings):
     # --- config for pydantic-settings v2 ---
     model_config = SettingsConfigDict(
@@ -24,8 +33,12 @@ class Settings(BaseSettings):
     SLM_MODEL: bool = False
 
     DATABASE_URL: str
+    # set when running several uvicorn workers so task progress is shared between them
+    REDIS_URL: str | None = None
 
     FERNET_KEY: str
+    # HS256 key for the API's bearer tokens; auth_user rejects every token while it is unset
+    JWT_SECRET: str | None = None
 
     API_PREFIX: str = "/api/v1"
 
@@ -33,33 +46,51 @@ class Settings(BaseSettings):
 
     ORIGINS: list[str] = ['http://localhost:5173'] 
 
-    # --- computed helpers ---
-    @property
+    # --- computed helpers (parsed once per Settings instance) ---
+    @cached_property
     def credentials_desktop_oauth(self) -> dict:
-        return json.loads(self.CREDENTIALS_DESKTOP_OAUTH)
+        return json_loads(self.CREDENTIALS_DESKTOP_OAUTH)
 
-    @property
+    @cached_property
     def credentials_desktop_token(self) -> dict:
-        return json.loads(self.CREDENTIALS_DESKTOP_TOKEN)
+        return json_loads(self.CREDENTIALS_DESKTOP_TOKEN)
 
     # normalize to absolute paths; accept str or Path
     @field_validator("DB_PATH", "TEMP_ATTACHED_DIR", "DEFAULT_SOURCES_PATH", mode="before")
     @classmethod
     def ensure_absolute(cls, v):
-        return Path(v).resolve()
+        # abspath is enough here; resolve() would lstat every path component
+        p = Path(v)
+        return p if p.is_absolute() else Path(os.path.abspath(p))
     
     # Create parent folder for DB_PATH (treated as a file path)
     @field_validator("DB_PATH", "DEFAULT_SOURCES_PATH", mode="after")
     @classmethod
     def ensure_db_parent_exists(cls, p: Path) -> Path:
+        if p.parent in _PREPARED:
+            return p
         p.parent.mkdir(parents=True, exist_ok=True)
+        _PREPARED.add(p.parent)
         return p
 
     # Create the directories if they don't exist
     @field_validator("TEMP_ATTACHED_DIR", mode="after")
     @classmethod
     def ensure_dirs_exist(cls, p: Path) -> Path:
+        if p in _PREPARED:
+            return p
         p.mkdir(parents=True, exist_ok=True)
+        _PREPARED.add(p)
         return p
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build Settings on first use and reuse it for the life of the process."""
+    return Settings()
+
+
+def __getattr__(name: str):
+    # Keep `from core.config import settings` working without parsing the env at import time
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,20 +1,41 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, Query
-from services.task_manager import TaskManager
+from typing import Any, Dict
+import jwt
+from core.config import settings
+from services.progress import TaskRegistry
+
+_JWT_OPTS = {"algorithms": ["HS256"]}
+
+# Known users keyed by email, with USERS_BY_ID indexing the same dicts by user id.
+# Write both through register_user so auth_user can look a token's subject up directly.
+# Nothing in the API signs users in yet: both stay empty (and auth_user answers 401)
+# until a caller registers users explicitly.
+USERS: Dict[str, Dict[str, Any]] = {}
+USERS_BY_ID: Dict[str, Dict[str, Any]] = {}
+
+def register_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Add or replace a user ({"id", "email", ...}) in both indexes."""
+    previous = USERS.get(user["email"])
+    if previous is not None and previous["id"] != user["id"]:
+        USERS_BY_ID.pop(previous["id"], None)
+    USERS[user["email"]] = user
+    USERS_BY_ID[user["id"]] = user
+    return user
 
 def auth_user(request: Request):
     auth = request.headers.get("Authorization","")
     if not auth.startswith("Bearer "): raise HTTPException(401, "Missing token")
+    if not settings.JWT_SECRET: raise HTTPException(401, "Invalid token")
     token = auth.split(" ",1)[1]
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        payload = jwt.decode(token, settings.JWT_SECRET, **_JWT_OPTS)
         uid = payload["sub"]
-    except Exception:
+    except (jwt.PyJWTError, KeyError):
         raise HTTPException(401, "Invalid token")
-    # naive: reverse index by user_id
-    u = next((u for u in USERS.values() if u["id"]==uid), None)
+    u = USERS_BY_ID.get(uid)
     if not u: raise HTTPException(401, "User not found")
     return u
 
-def get_task_manager(request: Request) -> TaskManager:
+def get_task_registry(request: Request) -> TaskRegistry:
     # Provided via app.state in main.py
-    return request.app.state.task_manager  # type: ignore[attr-defined]
\ No newline at end of file
+    return request.app.state.tasks  # type: ignore[attr-defined]
\ No newline at end of file
@@ -1,24 +1,209 @@
-from core.config import settings
+from core.config import get_settings
 from pathlib import Path
 from psycopg.rows import dict_row
 from utils.bill_utils import get_ph_time
 from utils.password_crypto import encrypt_password
-import json
+import asyncio
 import logging
 import psycopg
+import queue
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional
+    from json import loads as json_loads
 
 logger = logging.getLogger(__name__)
 
+# Long-lived connections shared by the API and the fetch job's worker threads,
+# so each query no longer pays a fresh TCP connect and auth handshake
+POOL_SIZE = 5
+# pooled connections idle longer than this are pinged before they are reused
+IDLE_CHECK_SEC = 30.0
+# holds (connection, monotonic time it was returned)
+_pool: queue.LifoQueue = queue.LifoQueue()
+_pool_lock = threading.Lock()
+_opened = 0
+
+_SQL_BILL_EXISTS = "SELECT 1 FROM bills WHERE name = %s AND sent_date = %s LIMIT 1"
+_SQL_FETCHED_RECENTLY = "SELECT 1 FROM last_run WHERE name = %s AND last_fetch_at > now() - interval '1 day' LIMIT 1"
+_SQL_ALL_BILLS = "SELECT * FROM bills ORDER BY status ASC, due_date ASC"
+_SQL_MARK_PAID = "UPDATE bills SET status = 'paid', paid_at = %s WHERE id = %s AND status <> 'paid'"
+_SQL_ADD_SOURCE = """
+    INSERT INTO bill_sources (
+        name, provider, gmail_query, sender_email, subject_like,
+        include_kw, exclude_kw, drive_folder_id, file_pattern,
+        currency, encrypted_password, category, useful_page, active
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE)
+    ON CONFLICT (name) DO NOTHING
+"""
+_SQL_KNOWN_MESSAGE_IDS = "SELECT DISTINCT source_email_id FROM bills WHERE source_email_id = ANY(%s)"
+
 
-def get_conn():
+def _connect() -> psycopg.Connection:
     return psycopg.connect(
-        settings.DATABASE_URL,
+        get_settings().DATABASE_URL,
+        row_factory=dict_row,
+        options="-c timezone=Asia/Manila"
+    )
+
+
+def _usable(conn: psycopg.Connection, idle_since: float) -> bool:
+    """Whether a pooled connection can be handed out; long-idle ones are pinged first."""
+    if conn.closed or conn.broken:
+        return False
+    if time.monotonic() - idle_since < IDLE_CHECK_SEC:
+        return True
+    # the server or a proxy may have dropped it while it sat in the pool
+    try:
+        conn.autocommit = True
+        conn.execute("")
+        conn.autocommit = False
+        return True
+    except psycopg.Error:
+        return False
+
+
+def _discard(conn: psycopg.Connection):
+    global _opened
+    try:
+        conn.close()
+    except Exception:
+        pass
+    with _pool_lock:
+        _opened -= 1
+
+
+def _checkout() -> psycopg.Connection:
+    global _opened
+    while True:
+        try:
+            conn, idle_since = _pool.get_nowait()
+        except queue.Empty:
+            with _pool_lock:
+                if _opened < POOL_SIZE:
+                    _opened += 1
+                    break
+            conn, idle_since = _pool.get()
+        if _usable(conn, idle_since):
+            return conn
+        # a dead connection frees its slot, so the next pass opens a replacement
+        _discard(conn)
+    try:
+        return _connect()
+    except Exception:
+        with _pool_lock:
+            _opened -= 1
+        raise
+
+
+def _checkin(conn: psycopg.Connection):
+    global _opened
+    if conn.closed or conn.broken:
+        with _pool_lock:
+            _opened -= 1
+        return
+    _pool.put((conn, time.monotonic()))
+
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection; commits on success, rolls back on error, then returns it."""
+    conn = _checkout()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        _checkin(conn)
+
+
+# Async pool for the API handlers; opened and closed with the FastAPI app
+ASYNC_POOL_SIZE = 5
+ACQUIRE_TIMEOUT = 2.0
+_apool: asyncio.Queue | None = None
+
+
+async def _aconnect() -> psycopg.AsyncConnection:
+    return await psycopg.AsyncConnection.connect(
+        get_settings().DATABASE_URL,
         row_factory=dict_row,
         options="-c timezone=Asia/Manila"
     )
 
 
+async def open_async_pool():
+    """Create the async pool and warm what it can; a database that is down only delays the connects."""
+    global _apool
+    if _apool is not None:
+        return
+    pool = asyncio.Queue()
+    # None marks a slot without a connection; get_async_conn connects it on acquire
+    for _ in range(ASYNC_POOL_SIZE):
+        pool.put_nowait(None)
+    _apool = pool
+    for _ in range(ASYNC_POOL_SIZE):
+        pool.get_nowait()
+        conn = None
+        try:
+            conn = await _aconnect()
+            # warm the connection so the first request does not pay for it
+            await conn.execute("SELECT 1")
+            await conn.commit()
+        except Exception as e:
+            logger.warning("Could not warm the async DB pool, connecting on first use: %s", e)
+            if conn is not None:
+                await conn.close()
+            pool.put_nowait(None)
+            break
+        pool.put_nowait(conn)
+
+
+async def close_async_pool():
+    global _apool
+    pool, _apool = _apool, None
+    while pool is not None and not pool.empty():
+        conn = pool.get_nowait()
+        if conn is not None:
+            await conn.close()
+
+
+@asynccontextmanager
+async def get_async_conn():
+    """Borrow a pooled async connection, waiting at most ACQUIRE_TIMEOUT seconds."""
+    if _apool is None:
+        raise RuntimeError("Async DB pool is not open.")
+    pool = _apool
+    conn = await asyncio.wait_for(pool.get(), ACQUIRE_TIMEOUT)
+    if conn is None or conn.closed or conn.broken:
+        try:
+            conn = await _aconnect()
+        except BaseException:
+            # keep the slot: the next borrower retries the connect
+            pool.put_nowait(None)
+            raise
+    try:
+        yield conn
+        await conn.commit()
+    except BaseException:
+        if not conn.closed:
+            await conn.rollback()
+        raise
+    finally:
+        # a dead connection is replaced on the next acquire, not here where a failed
+        # connect would lose the slot
+        pool.put_nowait(None if conn.closed or conn.broken else conn)
+
+
 def db_init():
+    settings = get_settings()
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("""
@@ -68,25 +253,14 @@ def db_init():
                 );
             """)
 
-            cur.execute("""
-                CREATE OR REPLACE FUNCTION set_updated_at()
-                RETURNS TRIGGER AS $$
-                BEGIN
-                    NEW.updated_at = CURRENT_TIMESTAMP;
-                    RETURN NEW;
-                END;
-                $$ LANGUAGE plpgsql;
-            """)
-
+            # updated_at is set by the UPDATE statements themselves rather than a per-row trigger
             cur.execute("""
                 DROP TRIGGER IF EXISTS trg_bill_sources_updated_at ON bill_sources;
             """)
 
             cur.execute("""
-                CREATE TRIGGER trg_bill_sources_updated_at
-                BEFORE UPDATE ON bill_sources
-                FOR EACH ROW
-                EXECUTE FUNCTION set_updated_at();
+                CREATE INDEX IF NOT EXISTS idx_bills_source_email_id
+                ON bills(source_email_id);
             """)
 
             cur.execute("""
@@ -116,12 +290,10 @@ def db_init():
             """)
 
             if settings.DEFAULT_SOURCES_PATH and Path(settings.DEFAULT_SOURCES_PATH).exists():
-                with open(settings.DEFAULT_SOURCES_PATH, "r", encoding="utf-8") as f:
-                    default_sources = json.load(f)
+                default_sources = json_loads(Path(settings.DEFAULT_SOURCES_PATH).read_bytes())
 
                 for item in default_sources:
-                    password = settings.model_extra[item['password_env']] if item['password_env'] != "None" else ""
-                    encrypted_password = encrypt_password(password) if password else None
+                    encrypted_password = encrypt_source_password(item['password_env'])
                     cur.execute("""
                         INSERT INTO bill_sources (
                             name, provider, gmail_query, sender_email, subject_like,
@@ -145,7 +317,8 @@ def db_init():
                             encrypted_password = EXCLUDED.encrypted_password,
                             category = EXCLUDED.category,
                             useful_page = EXCLUDED.useful_page,
-                            active = TRUE;
+                            active = TRUE,
+                            updated_at = CURRENT_TIMESTAMP;
                     """, {
                         "name": item.get("name"),
                         "provider": item.get("provider"),
@@ -199,21 +372,48 @@ def db_init():
 def bill_exists(item: dict) -> bool:
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT EXISTS(
-                    SELECT 1
-                    FROM bills
-                    WHERE name = %s AND sent_date = %s
-                )
-            """, (item.get("name"), item.get("sent_date")))
-            row = cur.fetchone()
-            return bool(row["exists"])
+            cur.execute(_SQL_BILL_EXISTS, (item.get("name"), item.get("sent_date")))
+            return cur.fetchone() is not None
 
 
-def db_insert_bill(item: dict):
+def known_message_ids(msg_ids: list[str]) -> set[str]:
+    """Return the Gmail message ids that already have a stored bill."""
+    if not msg_ids:
+        return set()
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
+            cur.execute(_SQL_KNOWN_MESSAGE_IDS, (list(msg_ids),))
+            return {row["source_email_id"] for row in cur.fetchall()}
+
+
+def _bill_row(item: dict) -> tuple:
+    return (
+        item.get("name"),
+        item.get("customer_number"),
+        item.get("statement_date"),
+        item.get("due_date"),
+        item.get("sent_date"),
+        item.get("credit_limit"),
+        item.get("total_amount_due"),
+        item.get("minimum_amount_due"),
+        item.get("currency", "PHP"),
+        item.get("status", "unpaid"),
+        item.get("source_email_id"),
+        item.get("drive_file_id"),
+        item.get("drive_file_name"),
+        get_ph_time() if item.get("status", "unpaid") == "paid" else None,
+        item.get("category", "uncategorized"),
+        item.get("notes", ""),
+    )
+
+
+def db_insert_bills(items: list[dict]):
+    """Insert several bills in one transaction; rows already stored are skipped."""
+    if not items:
+        return
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.executemany("""
                 INSERT INTO bills (
                     name, customer_number, statement_date,
                     due_date, sent_date, credit_limit, total_amount_due, 
@@ -223,24 +423,11 @@ def db_insert_bill(item: dict):
                 )
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 ON CONFLICT (name, sent_date) DO NOTHING
-            """, (
-                item.get("name"),
-                item.get("customer_number"),
-                item.get("statement_date"),
-                item.get("due_date"),
-                item.get("sent_date"),
-                item.get("credit_limit"),
-                item.get("total_amount_due"),
-                item.get("minimum_amount_due"),                
-                item.get("currency", "PHP"),
-                item.get("status", "unpaid"),
-                item.get("source_email_id"),
-                item.get("drive_file_id"),
-                item.get("drive_file_name"),
-                get_ph_time() if item.get("status", "unpaid") == "paid" else None,
-                item.get("category", "uncategorized"),
-                item.get("notes", ""),
-            ))
+            """, [_bill_row(item) for item in items])
+
+
+def db_insert_bill(item: dict):
+    db_insert_bills([item])
 
 
 def update_bill_source_folder_id(source_id: int, folder_id: str):
@@ -248,7 +435,8 @@ def update_bill_source_folder_id(source_id: int, folder_id: str):
         with conn.cursor() as cur:
             cur.execute("""
                 UPDATE bill_sources
-                SET drive_folder_id = %s
+                SET drive_folder_id = %s,
+                    updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
             """, (folder_id, source_id))
 
@@ -256,14 +444,16 @@ def update_bill_source_folder_id(source_id: int, folder_id: str):
 def db_all():
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT *
-                FROM bills
-                ORDER BY status ASC, due_date ASC
-            """)
+            cur.execute(_SQL_ALL_BILLS)
             return cur.fetchall()
 
 
+async def db_all_async():
+    async with get_async_conn() as conn:
+        cur = await conn.execute(_SQL_ALL_BILLS)
+        return await cur.fetchall()
+
+
 def get_bill_sources():
     with get_conn() as conn:
         with conn.cursor() as cur:
@@ -279,13 +469,12 @@ def get_bill_sources():
 def db_mark_paid(bill_id: int):
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                UPDATE bills
-                SET status = 'paid',
-                    paid_at = %s
-                WHERE id = %s
-                  AND status <> 'paid'
-            """, (get_ph_time(), bill_id))
+            cur.execute(_SQL_MARK_PAID, (get_ph_time(), bill_id))
+
+
+async def db_mark_paid_async(bill_id: int):
+    async with get_async_conn() as conn:
+        await conn.execute(_SQL_MARK_PAID, (get_ph_time(), bill_id))
 
 
 def get_last_run(name: str):
@@ -301,14 +490,21 @@ def get_last_run(name: str):
             row = cur.fetchone()
 
             if row:
-                logger.info("Latest run:")
-                logger.info(row)
+                logger.debug("last_run row for %s: %r", name, row)
                 return row
             else:
-                logger.info("No records found for:", name)
+                logger.debug("No last_run records found for %s", name)
                 return None
 
 
+def fetched_recently(name: str) -> bool:
+    """True if the source's last fetch was less than a day ago."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_SQL_FETCHED_RECENTLY, (name,))
+            return cur.fetchone() is not None
+
+
 def insert_or_update_last_run(item: dict):
     with get_conn() as conn:
         with conn.cursor() as cur:
@@ -329,32 +525,43 @@ def insert_or_update_last_run(item: dict):
             ))
 
 
+def encrypt_source_password(password_env: str | None) -> bytes | None:
+    """Encrypt the PDF password held in the setting named by password_env ('None' means no password)."""
+    if not password_env or password_env == "None":
+        return None
+    password = get_settings().model_extra.get(password_env)
+    if password is None:
+        raise ValueError(f"password_env {password_env!r} is not set.")
+    return encrypt_password(password) if password else None
+
+
+def _source_row(item: dict) -> tuple:
+    return (
+        item.get("name"),
+        item.get("provider"),
+        item.get("gmail_query"),
+        item.get("sender_email"),
+        item.get("subject_like"),
+        item.get("include_kw"),
+        item.get("exclude_kw"),
+        item.get("drive_folder_id"),
+        item.get("file_pattern"),
+        item.get("currency", "PHP"),
+        item.get("encrypted_password"),
+        item.get("category", "uncategorized"),
+        item.get("useful_page", [1]),
+    )
+
+
 def add_bill_source(item: dict):
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO bill_sources (
-                    name, provider, gmail_query, sender_email, subject_like,
-                    include_kw, exclude_kw, drive_folder_id, file_pattern,
-                    currency, encrypted_password, category, useful_page, active
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE)
-                ON CONFLICT (name) DO NOTHING
-            """, (
-                item.get("name"),
-                item.get("provider"),
-                item.get("gmail_query"),
-                item.get("sender_email"),
-                item.get("subject_like"),
-                item.get("include_kw"),
-                item.get("exclude_kw"),
-                item.get("drive_folder_id"),
-                item.get("file_pattern"),
-                item.get("currency", "PHP"),
-                item.get("encrypted_password"),
-                item.get("category", "uncategorized"),
-                item.get("useful_page", [1]),
-            ))
+            cur.execute(_SQL_ADD_SOURCE, _source_row(item))
+
+
+async def add_bill_source_async(item: dict):
+    async with get_async_conn() as conn:
+        await conn.execute(_SQL_ADD_SOURCE, _source_row(item))
 
 
 def main():
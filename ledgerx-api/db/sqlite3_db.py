@@ -1,209 +1,280 @@
+import atexit
 import sqlite3
-from core.config import settings
+import threading
+from core.config import get_settings
 from datetime import datetime
-import json
+import logging
 from pathlib import Path
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional
+    from json import loads as json_loads
+
+logger = logging.getLogger(__name__)
+
+_tls = threading.local()
+
+# Applied to every new connection; cache_size, temp_store and mmap_size are per-connection
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-64000",  # 64 MB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=2147483648",
+)
+
+# Bump whenever the DDL or default sources in db_init change
+SCHEMA_VERSION = 3
+
+_SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS bills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    due_date TEXT,
+    sent_date TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    amount TEXT,
+    currency TEXT DEFAULT 'PHP',
+    status TEXT DEFAULT 'unpaid',
+    source_email_id TEXT,
+    drive_file_id TEXT,
+    drive_file_name TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    paid_at TEXT,
+    category TEXT,
+    notes TEXT,
+
+    UNIQUE(name, due_date)
+);
+
+CREATE TABLE IF NOT EXISTS bill_sources (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    name            TEXT NOT NULL,
+    provider        TEXT NOT NULL
+                        CHECK (provider IN ('gmail','drive','manual')),
+    gmail_query     TEXT,
+    sender_email    TEXT,
+    subject_like    TEXT,
+    include_kw      TEXT,
+    exclude_kw      TEXT,
+    drive_folder_id TEXT,
+    file_pattern    TEXT,
+    currency        TEXT DEFAULT 'PHP',
+    password_env    TEXT,
+    category        TEXT DEFAULT 'uncategorized',
+    useful_page     TEXT ARRAY,
+    active          INTEGER NOT NULL DEFAULT 1,
+    created_at      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    updated_at      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    UNIQUE(name)
+);
+
+-- Track last run of fetching bills
+CREATE TABLE IF NOT EXISTS last_run (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    name          TEXT NOT NULL,
+    success       INTEGER NOT NULL DEFAULT 1,
+    duration_sec  REAL,
+    notes         TEXT,
+    last_fetch_at    TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    UNIQUE(name)
+);
+
+-- Older schemas only enforced UNIQUE(name, due_date), so a (name, sent_date) pair can
+-- repeat; keep one row per pair (a paid one first, then the oldest) so the index builds
+DELETE FROM bills WHERE id IN (
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY name, sent_date ORDER BY status = 'paid' DESC, id
+        ) AS rn
+        FROM bills WHERE name IS NOT NULL
+    ) WHERE rn > 1
+);
+-- INSERT OR IGNORE dedupes on this, so no separate existence check is needed
+CREATE UNIQUE INDEX IF NOT EXISTS uq_bills_name_sentdate ON bills(name, sent_date);
+CREATE INDEX IF NOT EXISTS idx_bills_source_email_id ON bills(source_email_id);
+CREATE INDEX IF NOT EXISTS idx_bill_sources_active ON bill_sources(active);
+CREATE INDEX IF NOT EXISTS idx_bill_sources_provider ON bill_sources(provider);
+CREATE INDEX IF NOT EXISTS idx_last_run_name_lastfetch ON last_run(name, last_fetch_at DESC);
+
+-- updated_at is set by the UPDATE statements themselves; the old AFTER UPDATE
+-- trigger rewrote every updated row a second time
+DROP TRIGGER IF EXISTS trg_bill_sources_updated_at;
+"""
+
+_SQL_SEED_SOURCE = """
+INSERT INTO bill_sources (
+    name, provider, gmail_query, sender_email, subject_like, include_kw, exclude_kw, drive_folder_id, file_pattern, currency, password_env, category
+) VALUES (
+    :name, :provider, :gmail_query, :sender_email, :subject_like, :include_kw, :exclude_kw, :drive_folder_id, :file_pattern, :currency, :password_env, :category
+)
+ON CONFLICT(name) DO UPDATE SET
+    provider = excluded.provider,
+    gmail_query = excluded.gmail_query,
+    sender_email = excluded.sender_email,
+    subject_like = excluded.subject_like,
+    include_kw = excluded.include_kw,
+    exclude_kw = excluded.exclude_kw,
+    drive_folder_id = excluded.drive_folder_id,
+    file_pattern = excluded.file_pattern,
+    currency = excluded.currency,
+    password_env = excluded.password_env,
+    category = excluded.category,
+    active = 1,
+    updated_at = strftime('%Y-%m-%dT%H:%M:%fZ','now')
+"""
+
+# Hot statements live at module scope so every call hands sqlite3 the same string
+# and hits the connection's statement cache
+_SQL_INSERT_BILL = """
+INSERT OR IGNORE INTO bills (name, due_date, sent_date, amount, currency, status, source_email_id,
+                   drive_file_id, drive_file_name, paid_at, category, notes)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_MARK_PAID = "UPDATE bills SET status='paid', paid_at=? WHERE id=? AND status!='paid'"
+_SQL_LAST_RUN = "SELECT last_fetch_at FROM last_run WHERE name = ? ORDER BY datetime(last_fetch_at) DESC LIMIT 1"
+_SQL_UPSERT_LAST_RUN = """
+INSERT INTO last_run (name, success, duration_sec, notes, last_fetch_at)
+VALUES (?, ?, ?, ?, strftime('%Y-%m-%dT%H:%M:%fZ','now'))
+ON CONFLICT(name) DO UPDATE SET
+    success = excluded.success,
+    duration_sec = excluded.duration_sec,
+    notes = excluded.notes,
+    last_fetch_at = excluded.last_fetch_at
+"""
+
+
+def _conn() -> sqlite3.Connection:
+    """Return this thread's long-lived connection, opening and tuning it on first use."""
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(get_settings().DB_PATH, isolation_level=None, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        _tls.conn = conn
+    return conn
+
+def close_conn():
+    """Refresh planner statistics and close this thread's connection, if one is open."""
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        return
+    _tls.conn = None
+    try:
+        conn.executescript("PRAGMA analysis_limit=400; PRAGMA optimize;")
+    finally:
+        conn.close()
+
+
+atexit.register(close_conn)
+
 def db_init():
-    with sqlite3.connect(settings.DB_PATH) as conn:
+    settings = get_settings()
+    with _conn() as conn:
         cur = conn.cursor()
 
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS bills (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            due_date TEXT,
-            sent_date TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
-            amount TEXT,
-            currency TEXT DEFAULT 'PHP',
-            status TEXT DEFAULT 'unpaid',
-            source_email_id TEXT,
-            drive_file_id TEXT,
-            drive_file_name TEXT,
-            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
-            paid_at TEXT,
-            category TEXT,
-            notes TEXT,
-                     
-            UNIQUE(name, due_date)
-        )""")
-
-        cur.executescript("""
-        CREATE TABLE IF NOT EXISTS bill_sources (
-            id              INTEGER PRIMARY KEY AUTOINCREMENT,
-            name            TEXT NOT NULL,
-            provider        TEXT NOT NULL
-                                CHECK (provider IN ('gmail','drive','manual')),
-            gmail_query     TEXT,
-            sender_email    TEXT,
-            subject_like    TEXT,
-            include_kw      TEXT,
-            exclude_kw      TEXT,
-            drive_folder_id TEXT,
-            file_pattern    TEXT,
-            currency        TEXT DEFAULT 'PHP',
-            password_env    TEXT,
-            category        TEXT DEFAULT 'uncategorized',
-            useful_page     TEXT ARRAY,
-            active          INTEGER NOT NULL DEFAULT 1,
-            created_at      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
-            updated_at      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
-            UNIQUE(name)
-        );
-
-        CREATE TRIGGER IF NOT EXISTS trg_bill_sources_updated_at
-        AFTER UPDATE ON bill_sources
-        FOR EACH ROW
-        BEGIN
-        UPDATE bill_sources
-        SET updated_at = strftime('%Y-%m-%dT%H:%M:%fZ','now')
-        WHERE id = NEW.id;
-        END;
-
-        CREATE INDEX IF NOT EXISTS idx_bill_sources_active ON bill_sources(active);
-        CREATE INDEX IF NOT EXISTS idx_bill_sources_provider ON bill_sources(provider);
-        """)
-
-        if settings.DEFAULT_SOURCES_PATH and Path(settings.DEFAULT_SOURCES_PATH).exists():
-            with open(settings.DEFAULT_SOURCES_PATH, "r", encoding="utf-8") as f:
-                default_sources = json.load(f)
-
-            cur.executemany("""
-                INSERT INTO bill_sources (
-                    name, provider, gmail_query, sender_email, subject_like, include_kw, exclude_kw, drive_folder_id, file_pattern, currency, password_env, category
-                ) VALUES (
-                    :name, :provider, :gmail_query, :sender_email, :subject_like, :include_kw, :exclude_kw, :drive_folder_id, :file_pattern, :currency, :password_env, :category
-                )
-                ON CONFLICT(name) DO UPDATE SET
-                    provider = excluded.provider,
-                    gmail_query = excluded.gmail_query,
-                    sender_email = excluded.sender_email,
-                    subject_like = excluded.subject_like,
-                    include_kw = excluded.include_kw,
-                    exclude_kw = excluded.exclude_kw,
-                    drive_folder_id = excluded.drive_folder_id,
-                    file_pattern = excluded.file_pattern,
-                    currency = excluded.currency,
-                    password_env = excluded.password_env,
-                    category = excluded.category,
-                    active = 1;
-            """, default_sources)
-
-        cur.executescript("""
-            -- Existing bills table creation here ...
-
-            -- Track last run of fetching bills
-            CREATE TABLE IF NOT EXISTS last_run (
-                id            INTEGER PRIMARY KEY AUTOINCREMENT,
-                name          TEXT NOT NULL,
-                success       INTEGER NOT NULL DEFAULT 1,
-                duration_sec  REAL,
-                notes         TEXT,
-                last_fetch_at    TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
-                UNIQUE(name)
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_last_run_name_lastfetch ON last_run(name, last_fetch_at DESC);
-        """)
-        conn.commit()
-
-def bill_exists(item: dict) -> bool:
-    with sqlite3.connect(settings.DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT EXISTS(
-                SELECT 1 FROM bills
-                WHERE name = ? AND sent_date = ?
-            )
-        """, (item.get("name"), item.get("sent_date")))
+        # Warm databases already carry the current schema and seed data
+        if cur.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
 
-        return bool(cur.fetchone()[0])
+        # One-shot bulk DDL on a brand-new file: journaling buys nothing there since a failed
+        # init is simply re-run. Upgrades of existing databases keep WAL so a failed
+        # migration rolls back instead of leaving a half-written file.
+        fresh = cur.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None
+        if fresh:
+            cur.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF; PRAGMA foreign_keys=OFF;")
+        try:
+            # Tables, then indexes, all in one script and one transaction
+            cur.executescript("BEGIN;\n" + _SCHEMA_DDL + "\nCOMMIT;")
+
+            cur.execute("BEGIN")
+            if settings.DEFAULT_SOURCES_PATH and Path(settings.DEFAULT_SOURCES_PATH).exists():
+                default_sources = json_loads(Path(settings.DEFAULT_SOURCES_PATH).read_bytes())
+                cur.executemany(_SQL_SEED_SOURCE, default_sources)
+            cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            cur.execute("COMMIT")
+        finally:
+            if conn.in_transaction:
+                cur.execute("ROLLBACK")
+            if fresh:
+                cur.executescript("PRAGMA foreign_keys=ON; PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;")
+
+def _bill_row(item: dict) -> tuple:
+    return (
+        item.get("name"),
+        item.get("due_date"),
+        item.get("sent_date"),
+        item.get("amount"),  
+        item.get("currency","PHP"),
+        item.get("status","unpaid"),
+        item.get("source_email_id"),
+        item.get("drive_file_id"),
+        item.get("drive_file_name"),
+        item.get("status","unpaid") == "paid" and datetime.now(datetime.timezone.utc).isoformat() or None,
+        item.get("category", "uncategorized"),
+        item.get("notes", "none"),
+    )
+
+def db_insert_bills(items: list[dict]):
+    """Insert several bills in one transaction, so the batch costs a single commit."""
+    if not items:
+        return
+    conn = _conn()
+    conn.execute("BEGIN")
+    try:
+        conn.executemany(_SQL_INSERT_BILL, [_bill_row(item) for item in items])
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
 
 def db_insert_bill(item: dict):
-    with sqlite3.connect(settings.DB_PATH) as conn:
-        conn.execute("""
-        INSERT OR IGNORE INTO bills (name, due_date, sent_date, amount, currency, status, source_email_id,
-                           drive_file_id, drive_file_name, paid_at, category, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            item.get("name"),
-            item.get("due_date"),
-            item.get("sent_date"),
-            item.get("amount"),  
-            item.get("currency","PHP"),
-            item.get("status","unpaid"),
-            item.get("source_email_id"),
-            item.get("drive_file_id"),
-            item.get("drive_file_name"),
-            item.get("status","unpaid") == "paid" and datetime.now(datetime.timezone.utc).isoformat() or None,
-            item.get("category", "uncategorized"),
-            item.get("notes", "none"),
-        ))
-        conn.commit()
+    db_insert_bills([item])
 
 def db_all():
-    with sqlite3.connect(settings.DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.execute("SELECT * FROM bills ORDER BY status ASC, due_date ASC")
+    with _conn() as conn:
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        cur.execute("SELECT * FROM bills ORDER BY status ASC, due_date ASC")
         return [dict(r) for r in cur.fetchall()]
 
 def get_bill_sources():
-    with sqlite3.connect(settings.DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.execute("SELECT * FROM bill_sources WHERE active=1 ORDER BY name ASC")
+    with _conn() as conn:
+        cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        cur.execute("SELECT * FROM bill_sources WHERE active=1 ORDER BY name ASC")
         return [dict(r) for r in cur.fetchall()]
 
 def db_mark_paid(bill_id: int):
-    with sqlite3.connect(settings.DB_PATH) as conn:
-        conn.execute("UPDATE bills SET status='paid', paid_at=? WHERE id=? AND status!='paid'",
-                     (datetime.now(datetime.timezone.utc).isoformat(), bill_id))
-        conn.commit()
+    with _conn() as conn:
+        conn.execute(_SQL_MARK_PAID, (datetime.now(datetime.timezone.utc).isoformat(), bill_id))
 
 def get_last_run(name):
-    with sqlite3.connect(settings.DB_PATH) as conn:
+    with _conn() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT last_fetch_at FROM last_run WHERE name = ? ORDER BY datetime(last_fetch_at) DESC LIMIT 1",(name,))
+        cur.execute(_SQL_LAST_RUN, (name,))
         row = cur.fetchone()
 
         if row:
-            print("Latest run:")
-            print(row)
+            logger.debug("last_run row for %s: %r", name, row)
             return row
-        else:
-            print("No records found for:", name)
-        
+
+        logger.debug("No last_run records found for %s", name)
         return None
     
 def insert_or_update_last_run(item):
-    if get_last_run(item.get("name")):
-        with sqlite3.connect(settings.DB_PATH) as conn:
-            conn.execute("""
-            UPDATE last_run
-            SET success = ?, duration_sec = ?, notes = ?, last_fetch_at = ?
-            WHERE name = ?
-            """, (
-                item.get("success", 0),
-                item.get("duration_sec"),
-                item.get("notes", "none"),
-                datetime.utcnow().isoformat(),
-                item.get("name")
-            ))
-            conn.commit()
-    else:
-        with sqlite3.connect(settings.DB_PATH) as conn:
-            conn.execute("""
-            INSERT INTO last_run (name, success, duration_sec, notes)
-            VALUES (?, ?, ?, ?)
-            """, (
-                item.get("name"),
-                item.get("success", 0),
-                item.get("duration_sec"),
-                item.get("notes", "none")
-            ))
-            conn.commit()
+    with _conn() as conn:
+        conn.execute(_SQL_UPSERT_LAST_RUN, (
+            item.get("name"),
+            item.get("success", 0),
+            item.get("duration_sec"),
+            item.get("notes", "none")
+        ))
 
 def add_bill_source(item: dict):
-    with sqlite3.connect(settings.DB_PATH) as conn:
+    with _conn() as conn:
         cur = conn.cursor()
         cur.execute("""
         INSERT INTO bill_sources (name, provider, gmail_query, sender_email, subject_like,
@@ -226,7 +297,6 @@ def add_bill_source(item: dict):
             item.get("useful_page", [1]),
             1
         ))
-        conn.commit()
 
 def main():
     db_init()
@@ -1,26 +1,46 @@
 
-from core.config import settings
+from core.config import get_settings
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from typing import Any
+import threading
+
+_tls = threading.local()
+
 
 def build_drive_service() -> Any:
     """Drive API service using stored token."""
     creds = None
-    if settings.credentials_desktop_token:
-        creds = Credentials.from_authorized_user_info(settings.credentials_desktop_token)
+    token_info = get_settings().credentials_desktop_token
+    if token_info:
+        creds = Credentials.from_authorized_user_info(token_info)
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
             raise Exception("No valid credentials available. Please set CREDENTIALS_DESKTOP_TOKEN in your .env file.")
-    return build("drive", "v3", credentials=creds)
+    return build("drive", "v3", credentials=creds, cache_discovery=False, static_discovery=True)
+
+
+def get_drive_service() -> Any:
+    """Build the Drive client once per token and thread, keeping its HTTP connection alive.
+
+    The credentials refresh themselves on expiry; httplib2 is not thread-safe, so
+    each worker thread keeps its own service.
+    """
+    token_info = get_settings().credentials_desktop_token or {}
+    fingerprint = token_info.get("client_id", "") + token_info.get("refresh_token", "")
+    cached = getattr(_tls, "service", None)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, build_drive_service())
+        _tls.service = cached
+    return cached[1]
 
 
 def list_files_in_folder(folder_id: str) -> list[dict]:
-    svc = build_drive_service()
+    svc = get_drive_service()
     query = f"'{folder_id}' in parents and trashed=false"
     results = svc.files().list(q=query, fields="files(id, name)").execute()
     return results.get("files", [])
\ No newline at end of file
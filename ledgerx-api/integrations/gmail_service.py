@@ -1,18 +1,52 @@
-from core.config import settings
+from core.config import get_settings
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-import base64
+import binascii
 import os
 import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.errors import HttpError
 from datetime import datetime
+from functools import lru_cache
 from utils.bill_utils import get_ph_time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_tls = threading.local()
+
+# Gmail accepts up to 100 calls per batch but starts rate limiting well before that
+GMAIL_BATCH_SIZE = 50
+SAVE_WORKERS = 8
+
+# Partial-response mask for messages.get: only the MIME skeleton (filenames and
+# attachment ids, three levels deep) plus internalDate, so inline bodies are not sent
+_PART_FIELDS = "filename,body/attachmentId"
+MESSAGE_SKELETON_FIELDS = (
+    f"id,internalDate,"
+    f"payload({_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS}))))"
+)
+
+_PDF_SUFFIXES = (".pdf", ".PDF")
+_UNSAFE = re.compile(r'[\\/:*?"<>|]+')
+
+# Attachment data is urlsafe base64; decode it 64 KiB (a multiple of 4) at a time
+_B64_CHUNK = 64 * 1024
+_URLSAFE_TO_STD = str.maketrans("-_", "+/")
+
+@lru_cache(maxsize=1)
+def _temp_dir() -> str:
+    """TEMP_ATTACHED_DIR as a plain str, resolved once instead of per attachment."""
+    return os.fspath(get_settings().TEMP_ATTACHED_DIR)
 
 def build_gmail_service():
     creds = None
-    if settings.credentials_desktop_token:
-        creds = Credentials.from_authorized_user_info(settings.credentials_desktop_token)
+    token_info = get_settings().credentials_desktop_token
+    if token_info:
+        creds = Credentials.from_authorized_user_info(token_info)
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -21,23 +55,114 @@ def build_gmail_service():
             raise RuntimeError("No valid Gmail credentials found.")
 
     try:
-        service = build("gmail", "v1", credentials=creds)
+        service = build("gmail", "v1", credentials=creds, cache_discovery=False, static_discovery=True)
         return service
     except HttpError as e:
         raise RuntimeError(f"Gmail service build failed: {e}")
 
+def get_gmail_service():
+    """Build the Gmail client once per token and thread; the credentials refresh themselves on expiry.
+
+    googleapiclient services share an httplib2 connection that is not thread-safe,
+    so concurrent extract_bills calls each keep their own.
+    """
+    token_info = get_settings().credentials_desktop_token or {}
+    fingerprint = token_info.get("client_id", "") + token_info.get("refresh_token", "")
+    cached = getattr(_tls, "service", None)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, build_gmail_service())
+        _tls.service = cached
+    return cached[1]
+
 def list_messages(service, query, max_results=100):
     resp = service.users().messages().list(userId="me", q=query, maxResults=max_results).execute()
     return resp.get("messages", [])
 
+def list_messages_batched(service, queries, max_results=100):
+    """Run several messages.list queries through batched HTTP calls. Returns {key: [messages]} for a {key: query} dict."""
+    keys = list(queries)
+    found = {}
+
+    def _collect(request_id, response, exception):
+        key = keys[int(request_id)]
+        if exception is not None:
+            logger.warning("Failed to list messages for %s: %s", key, exception)
+            return
+        found[key] = response.get("messages", [])
+
+    for i in range(0, len(keys), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_collect)
+        for idx in range(i, min(i + GMAIL_BATCH_SIZE, len(keys))):
+            batch.add(
+                service.users().messages().list(userId="me", q=queries[keys[idx]], maxResults=max_results),
+                request_id=str(idx),
+            )
+        batch.execute()
+    return found
+
+def list_source_messages(sources):
+    """List every source's matching messages in one batched round trip. Returns {source name: [messages]}."""
+    return list_messages_batched(get_gmail_service(), {s["name"]: s["gmail_query"] for s in sources})
+
 def get_message(service, msg_id):
     return service.users().messages().get(userId="me", id=msg_id, format="full").execute()
 
+def get_messages(service, msg_ids, fmt="full", fields=MESSAGE_SKELETON_FIELDS):
+    """Fetch several messages through batched HTTP calls. Returns {msg_id: message}.
+
+    By default only the part structure needed by iter_pdf_attachments is requested.
+    """
+    found = {}
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            logger.warning("Failed to fetch message %s: %s", request_id, exception)
+            return
+        found[request_id] = response
+
+    for i in range(0, len(msg_ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_collect)
+        for msg_id in msg_ids[i:i + GMAIL_BATCH_SIZE]:
+            batch.add(
+                service.users().messages().get(userId="me", id=msg_id, format=fmt, fields=fields),
+                request_id=msg_id,
+            )
+        batch.execute()
+    return found
+
+def get_attachments(service, refs, on_data=None):
+    """Fetch attachment payloads for (msg_id, attachment_id) pairs in batches. Returns {(msg_id, attachment_id): data}.
+
+    With `on_data`, each payload is handed to on_data(ref, data) as it arrives instead of
+    being collected, so a whole batch of PDFs is never held in memory at once.
+    """
+    found = {}
+
+    def _collect(request_id, response, exception):
+        ref = refs[int(request_id)]
+        if exception is not None:
+            logger.warning("Failed to fetch attachment %s of message %s: %s", ref[1], ref[0], exception)
+            return
+        if on_data is not None:
+            on_data(ref, response.get("data"))
+        else:
+            found[ref] = response.get("data")
+
+    for i in range(0, len(refs), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_collect)
+        for idx in range(i, min(i + GMAIL_BATCH_SIZE, len(refs))):
+            msg_id, attachment_id = refs[idx]
+            batch.add(
+                service.users().messages().attachments().get(userId="me", messageId=msg_id, id=attachment_id),
+                request_id=str(idx),
+            )
+        batch.execute()
+    return found
+
 def iter_pdf_attachments(msg):
-    """Yield (filename, attachmentId) for PDF attachments found in message parts."""
-    payload = msg.get("payload", {}) or {}
-    stack = [payload]
-    sent_ts = msg.get("internalDate")  
+    """Yield (filename, attachmentId, sent_date) for PDF attachments found in message parts."""
+    sent_ts = msg.get("internalDate")
+    sent_date = None
 
     # Convert timestamp if available
     if sent_ts:
@@ -47,46 +172,93 @@ def iter_pdf_attachments(msg):
         except Exception:
             pass
 
-    while stack:
-        part = stack.pop()
-        # push nested parts
-        for sub in part.get("parts", []) or []:
-            stack.append(sub)
+    parts = deque((msg.get("payload") or {},))
+    pop, push = parts.popleft, parts.append
+    while parts:
+        part = pop()
+        # queue nested parts
+        for sub in part.get("parts") or ():
+            push(sub)
         # check current part for attachment
-        filename = part.get("filename") or ""
-        body = part.get("body") or {}
-        if filename and "attachmentId" in body and filename.lower().endswith(".pdf"):
-            yield filename, body["attachmentId"], sent_date
+        filename = part.get("filename")
+        if not filename:
+            continue
+        attachment_id = (part.get("body") or {}).get("attachmentId")
+        if attachment_id and filename.endswith(_PDF_SUFFIXES):
+            yield filename, attachment_id, sent_date
 
-def download_attachment(service, msg_id, attachment_id, filename, outname):
-    att = service.users().messages().attachments().get(
-        userId="me", messageId=msg_id, id=attachment_id
-    ).execute()
-    data = att.get("data")
+def save_attachment(data, msg_id, filename, outname):
     if not data:
         return None
-    file_bytes = base64.urlsafe_b64decode(data.encode("utf-8"))
-    safe = re.sub(r'[\\/:*?"<>|]+', "_", filename) or f"{msg_id}.pdf"
-    path = os.path.join(settings.TEMP_ATTACHED_DIR, outname)
-    
+    safe = _UNSAFE.sub("_", filename) or f"{msg_id}.pdf"
+    path = os.path.join(_temp_dir(), outname)
+
+    # Decode in slices so the whole PDF never sits in memory next to its base64 text
+    data = data.translate(_URLSAFE_TO_STD) + "=" * (-len(data) % 4)
     with open(path, "wb") as f:
-        f.write(file_bytes)
+        for i in range(0, len(data), _B64_CHUNK):
+            f.write(binascii.a2b_base64(data[i:i + _B64_CHUNK]))
     return path
 
-def extract_bills(source):
-    query = source['gmail_query']
-    service = build_gmail_service()
-    msgs = list_messages(service, query, max_results=100)
+def download_attachment(service, msg_id, attachment_id, filename, outname):
+    att = service.users().messages().attachments().get(
+        userId="me", messageId=msg_id, id=attachment_id
+    ).execute()
+    return save_attachment(att.get("data"), msg_id, filename, outname)
+
+def extract_bills(source, exclude=None, msgs=None):
+    """Download the PDF bills matching the source's Gmail query.
 
-    saved = []
+    `exclude`, if given, maps a list of message ids to the ids that are already
+    stored; those messages are dropped before any message or attachment fetch.
+    `msgs` takes an already-listed result (see list_source_messages) in place of
+    running the source's query here.
+    """
+    service = get_gmail_service()
+    if msgs is None:
+        msgs = list_messages(service, source['gmail_query'], max_results=100)
+    if exclude is not None and msgs:
+        known = exclude([m["id"] for m in msgs])
+        msgs = [m for m in msgs if m["id"] not in known]
+    full_msgs = get_messages(service, [m["id"] for m in msgs])
+
+    pending = []
     for m in msgs:
-        full = get_message(service, m["id"])
-        for fname, att_id, sent_date in iter_pdf_attachments(full):
+        full = full_msgs.get(m["id"])
+        if not full:
+            continue
+        for n, (fname, att_id, sent_date) in enumerate(iter_pdf_attachments(full)):
             outname = source['file_pattern'].format(
                 month=sent_date.strftime("%B"),
                 year=sent_date.strftime("%Y")
             )
-            out = download_attachment(service, m["id"], att_id, fname, outname)
-            if out:
-                saved.append((m["id"], sent_date, out, outname))
-    return saved
+            pending.append((m["id"], att_id, fname, outname, sent_date, n))
+
+    # outname is the Drive name and repeats for every bill in the same month, so the
+    # local copy is keyed by message and attachment to keep concurrent saves apart
+    names = {
+        (msg_id, att_id): (fname, f"{msg_id}_{n}_{outname}")
+        for msg_id, att_id, fname, outname, _, n in pending
+    }
+
+    # write each attachment as soon as its batch part arrives; file writes release
+    # the GIL, so the saves overlap with the remaining downloads
+    with ThreadPoolExecutor(max_workers=SAVE_WORKERS) as ex:
+        futs = {}
+
+        def _save(ref, data):
+            # one save per attachment: a repeated ref would race the first write to the same path
+            if ref in futs:
+                return
+            fname, diskname = names[ref]
+            futs[ref] = ex.submit(save_attachment, data, ref[0], fname, diskname)
+
+        get_attachments(service, list(names), on_data=_save)
+        seen = set()
+        saved = []
+        for msg_id, att_id, _, outname, sent_date, _ in pending:
+            ref = (msg_id, att_id)
+            if ref in futs and ref not in seen:
+                seen.add(ref)
+                saved.append((msg_id, sent_date, futs[ref].result(), outname))
+    return [item for item in saved if item[2]]
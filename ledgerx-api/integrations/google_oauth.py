@@ -1,5 +1,5 @@
 from google_auth_oauthlib.flow import Flow
-from core.config import settings
+from core.config import get_settings
 
 SCOPES = [
     "openid",
@@ -9,7 +9,7 @@ SCOPES = [
 ]
 
 def get_google_flow(state=None):
-    client_config = settings.google_client_config
+    client_config = get_settings().google_client_config
     flow = Flow.from_client_config(
         client_config,
         scopes=SCOPES,
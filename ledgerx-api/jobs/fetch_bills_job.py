@@ -1,22 +1,24 @@
-from integrations.gmail_service import extract_bills
-from db.database import get_bill_sources, insert_or_update_last_run, get_last_run, db_insert_bill, bill_exists
+from integrations.gmail_service import extract_bills, list_source_messages
+from db.database import get_bill_sources, insert_or_update_last_run, fetched_recently, db_insert_bills, bill_exists, known_message_ids
 from jobs.gdrive_job import create_folder_structure, upload_pdf
 from utils.bill_preprocessing import extract_bill_fields
+from utils.password_crypto import decrypt_password
 from core.config import settings
-from datetime import datetime, timedelta
+from services import bills_cache
+from services.progress import PROGRESS
 
 import asyncio
-from datetime import datetime, timedelta
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from zoneinfo import ZoneInfo
-
 import logging
 
 logger = logging.getLogger(__name__)
 
-MANILA_TZ = ZoneInfo("Asia/Manila")
-
 # ---- tiny helpers -----------------------------------------------------------
 
 def _now():
@@ -27,6 +29,46 @@ async def run_blocking(fn, *args, **kwargs):
     return await asyncio.to_thread(fn, *args, **kwargs)
 
 
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _init_cpu_worker():
+    # one worker per core already; keep each tesseract run single-threaded so they do not oversubscribe
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_cpu_worker)
+    return _cpu_pool
+
+
+async def run_cpu_bound(fn, *args, **kwargs):
+    """Run picklable CPU-heavy work (PDF decrypt/OCR/parsing) in a worker process, outside the GIL."""
+    return await asyncio.get_running_loop().run_in_executor(_get_cpu_pool(), partial(fn, *args, **kwargs))
+
+
+async def warm_cpu_pool():
+    """Start the extraction worker processes ahead of the first fetch (called from the app lifespan).
+
+    Workers fork from a parent that already imported PyMuPDF/pikepdf and compiled the
+    parser regexes, so the first bill does not pay for process start-up.
+    """
+    if model is not None:
+        return  # the SLM path runs on threads and never uses the pool
+    loop = asyncio.get_running_loop()
+    pool = _get_cpu_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(os.cpu_count() or 1)))
+
+
+def shutdown_cpu_pool():
+    global _cpu_pool
+    pool, _cpu_pool = _cpu_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 def retry(backoff=(0.5, 1.0, 2.0), exceptions=(Exception,)):
     def deco(fn):
         async def wrapped(*args, **kwargs):
@@ -59,10 +101,14 @@ required_fields = settings.REQUIRED_FIELDS
 
 @retry()
 async def extract_bill_fields_async(value: Dict[str, Any], required_fields: List[str]) -> Optional[Dict[str, Any]]:
-    # wrap the blocking/CPU work (OCR/regex/PDF) off the event loop
-    return await run_blocking(extract_bill_fields, value, required_fields, model=model, tokenizer=tokenizer)
-
-async def process_single_bill(value: Dict[str, Any], folders: Dict[str, str], sem: asyncio.Semaphore, required_fields: List[str] = settings.REQUIRED_FIELDS):
+    # wrap the blocking/CPU work (OCR/regex/PDF) off the event loop; the SLM
+    # model cannot be shipped to worker processes, so that path stays on threads
+    if model is not None:
+        return await run_blocking(extract_bill_fields, value, required_fields, model=model, tokenizer=tokenizer)
+    return await run_cpu_bound(extract_bill_fields, value, required_fields, lang=LANG)
+
+async def process_single_bill(value: Dict[str, Any], folders: Dict[str, str], sem: asyncio.Semaphore, required_fields: List[str] = settings.REQUIRED_FIELDS) -> Optional[Dict[str, Any]]:
+    """Extract and upload one bill; returns the row to insert, or None if it was skipped or failed."""
     dec_path = None
     async with sem:
         try:
@@ -104,51 +150,37 @@ async def process_single_bill(value: Dict[str, Any], folders: Dict[str, str], se
                 "drive_file_name": value['outname'],
                 "category": value.get("category", "uncategorized"),
             }
-            await run_blocking(db_insert_bill, record)
-            await run_blocking(insert_or_update_last_run, {
-                "name": value["name"],
-                "success": True,
-                "duration_sec": (_now() - value["start_time"]).total_seconds()
-            })
             logger.info(f"Extracted bill data: {bill_data}")
+            return record
         
         except Exception as e:
             logger.info(f"Error processing bill {value['bills_path']}: {e}")
 
         finally:
-            if dec_path is not None and dec_path.exists():
+            # decrypt_to_temp hands back the attachment itself when no copy was needed
+            if dec_path is not None and dec_path != Path(value["bills_path"]) and dec_path.exists():
                 try:
                     dec_path.unlink(missing_ok=True)
                 except Exception:
                     pass
 
 
-async def process_source(source: Dict[str, Any], folders: Dict[str, str], bill_sem: asyncio.Semaphore):
-    # 1-day skip
-    last_run = await run_blocking(get_last_run, source["name"])
-    if last_run:
-        last_fetch_at = last_run.get("last_fetch_at")
-    else:
-        last_fetch_at = None
-        
-    if last_fetch_at:
-        # Ensure it's aware
-        if last_fetch_at.tzinfo is None:
-            last_fetch_at = last_fetch_at.replace(tzinfo=MANILA_TZ)
-        else:
-            # Convert from UTC → Manila
-            last_fetch_at = last_fetch_at.astimezone(MANILA_TZ)
-
-        if datetime.now(MANILA_TZ) - last_fetch_at < timedelta(days=1):
-            logger.info(f"Skipping source {source['name']} as it was fetched less than 1 day ago.")
-            return
+async def process_source(source: Dict[str, Any], folders: Dict[str, str], bill_sem: asyncio.Semaphore, src_sem: asyncio.Semaphore, msgs: List[Dict[str, Any]]):
+    async with src_sem:
+        await _process_source(source, folders, bill_sem, msgs)
+
 
+async def _process_source(source: Dict[str, Any], folders: Dict[str, str], bill_sem: asyncio.Semaphore, msgs: List[Dict[str, Any]]):
     encrypted_password = source['encrypted_password']
+    # decrypt once per source instead of once per bill
+    password = decrypt_password(encrypted_password) if encrypted_password is not None else None
 
     # fetch list of bills (blocking I/O), then fan out per bill
-    bills_path = await run_blocking(extract_bills, source)
+    # emails that already produced a bill are skipped before any download or OCR
+    bills_path = await run_blocking(extract_bills, source, exclude=known_message_ids, msgs=msgs)
     logger.info(f"Fetched {len(bills_path)} new bills for source {source['name']}.")
 
+    start_time = _now()
     tasks = []
     for idx, (message_id, sent_date, path, outname) in enumerate(bills_path, start=1):
         value = {
@@ -156,6 +188,7 @@ async def process_source(source: Dict[str, Any], folders: Dict[str, str], bill_s
             "sent_date": sent_date,
             "bills_path": path,
             "encrypted_password": encrypted_password,
+            "password": password,
             "start_time": _now(),
             "label": f"{source['name']} {idx}",
             "category": source.get("category", "uncategorized"),
@@ -165,19 +198,64 @@ async def process_source(source: Dict[str, Any], folders: Dict[str, str], bill_s
         }
         tasks.append(asyncio.create_task(process_single_bill(value, folders, bill_sem)))
 
-    if tasks:
-        await asyncio.gather(*tasks)
+    if not tasks:
+        return
+
+    # a failing bill must not drop the rest of the source's batch
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    records = []
+    for r in results:
+        if isinstance(r, BaseException):
+            logger.info(f"Bill task failed for source {source['name']}: {r}")
+        elif r:
+            records.append(r)
+    if records:
+        # insert the whole source's bills in one transaction
+        await run_blocking(db_insert_bills, records)
+        await run_blocking(insert_or_update_last_run, {
+            "name": source["name"],
+            "success": True,
+            "duration_sec": (_now() - start_time).total_seconds()
+        })
 
 
-async def run_fetch_all_async():
+async def run_fetch_all_async(task_id: Optional[str] = None):
+    """Fetch every due source; with `task_id`, report per-source progress to PROGRESS."""
     try:
         sources = await asyncio.to_thread(get_bill_sources)
-        bill_sem = asyncio.Semaphore(5)
+        bill_sem = asyncio.Semaphore(CONCURRENCY_PER_BILL)
+        src_sem = asyncio.Semaphore(CONCURRENCY_PER_SOURCE)
 
         folders = await create_folder_structure(sources)
 
-        for source in sources:
-            await process_source(source, folders, bill_sem)
+        # 1-day skip, decided by the database against the indexed last_fetch_at
+        recent = await asyncio.gather(*(run_blocking(fetched_recently, source["name"]) for source in sources))
+        due = []
+        for source, skip in zip(sources, recent):
+            if skip:
+                logger.info(f"Skipping source {source['name']} as it was fetched less than 1 day ago.")
+            else:
+                due.append(source)
+        if not due:
+            return
+
+        # one batched Gmail round trip lists every due source's messages
+        listed = await run_blocking(list_source_messages, due)
+
+        done = 0
+
+        async def _tracked(source):
+            nonlocal done
+            await process_source(source, folders, bill_sem, src_sem, listed.get(source["name"], []))
+            done += 1
+            if task_id is not None:
+                await PROGRESS.update_progress(task_id, 100.0 * done / len(due), f"Processed {source['name']}")
+
+        # overlap the Gmail/Drive-bound work of different sources
+        try:
+            await asyncio.gather(*(_tracked(source) for source in due))
+        finally:
+            bills_cache.invalidate()
 
     except Exception as e:
         logger.info(f"Error in run_fetch_all_async: {e}")
@@ -1,6 +1,6 @@
 from typing import Any, Dict
 from db.database import update_bill_source_folder_id
-from integrations.gdrive_service import build_drive_service
+from integrations.gdrive_service import build_drive_service, get_drive_service
 from googleapiclient.http import MediaFileUpload
 import asyncio
 import time
@@ -170,20 +170,21 @@ async def create_folder_structure(sources: list[dict[str, Any]]) -> dict:
 
 
 async def upload_pdf(local_path: str, folder_id: str, filename: str) -> str:
-    svc = await asyncio.to_thread(build_drive_service)
-
     file_metadata = {
         "name": filename,
         "parents": [folder_id],
     }
 
+    # bill PDFs are small: one multipart request instead of a resumable session
     media = MediaFileUpload(
         local_path,
         mimetype="application/pdf",
-        resumable=True,
+        resumable=False,
     )
 
     def _upload():
+        # fetched on the worker thread, which reuses its cached client and connection
+        svc = get_drive_service()
         logger.info("Uploading PDF '%s' to folder %s", filename, folder_id)
 
         request = svc.files().create(
@@ -1,17 +1,44 @@
 from core.logging_config import setup_logging
 import logging
+from contextlib import asynccontextmanager
+import anyio.to_thread
 from fastapi import FastAPI
-from routers import health, bills
+from routers import health, bills, tasks, source
 from fastapi.middleware.cors import CORSMiddleware
 from core.config import settings
+from db.database import open_async_pool, close_async_pool
+from services.progress import PROGRESS
+from jobs.fetch_bills_job import warm_cpu_pool, shutdown_cpu_pool
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Sync endpoints and dependencies (auth, reminders, auth_user) run on anyio's threadpool,
+# 40 tokens by default; widen it until they are migrated to async def
+THREADPOOL_TOKENS = 100
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_TOKENS
+    app.state.tasks = PROGRESS
+    await open_async_pool()
+    await PROGRESS.connect(settings.REDIS_URL)
+    # pay for worker start-up at deploy time rather than on the first fetch
+    await warm_cpu_pool()
+    try:
+        yield
+    finally:
+        shutdown_cpu_pool()
+        await PROGRESS.close()
+        await close_async_pool()
+
+
 app = FastAPI(
     title="Bills API",
     description="API for bills",
-    version="1.0.0")
+    version="1.0.0",
+    lifespan=lifespan)
 
 
 app.add_middleware(
@@ -25,3 +52,5 @@ app.add_middleware(
 # Include routers
 app.include_router(health.router)
 app.include_router(bills.router)
+app.include_router(tasks.router)
+app.include_router(source.router)
@@ -4,7 +4,9 @@ from typing import Optional
 from core.config import settings
 from jobs.fetch_bills_job import run_fetch_all_async
 from datetime import datetime, timezone
-from db.database import db_all, db_mark_paid
+from db.database import db_mark_paid_async
+from services import bills_cache
+from services.progress import PROGRESS
 
 router = APIRouter(prefix=settings.API_PREFIX, tags=["bills"])
 
@@ -24,45 +26,37 @@ class PayResult(BaseModel):
     status: str
 
 
-@router.get("/fetch_bills")
+FETCH_TASK_ID = "fetch_bills:global"
+
+@router.get("/fetch_bills", status_code=202)
 async def fetch_bills():
-    try:
-        await run_fetch_all_async()
-        return {
-            "status": "Success",
-            "message": "Successfully fetched bills!"
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # OCR and Gmail/Drive I/O take minutes; run them on the loop and let the client poll.
+    # A fetch already in flight is shared rather than started twice.
+    PROGRESS.create(FETCH_TASK_ID, lambda: run_fetch_all_async(task_id=FETCH_TASK_ID), "Fetching bills")
+    return {
+        "task_id": FETCH_TASK_ID,
+        "status_url": f"{settings.API_PREFIX}/tasks/{FETCH_TASK_ID}"
+    }
 
 
 @router.get("/get_bills")
-def get_bills():
+async def get_bills():
     try:
-        bills = db_all()
-        response = {
-            "status": "Success",
-            "bills": bills
-        }
+        bills = await bills_cache.get_all_cached()
     except Exception as e:
-        response = {
-            "status": "Failed",
-            "message": "Failed to retrieve bills.",
-            "details:": e
-        }
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return response
+    return {
+        "status": "Success",
+        "bills": bills
+    }
     
 
 @router.post("/{bill_id}/pay")
-def pay_bill(bill_id: str):
+async def pay_bill(bill_id: str):
     try:
-        mark_paid = db_mark_paid(bill_id)
-        response = PayResult(bill_id=bill_id, status="paid")
+        await db_mark_paid_async(bill_id)
+        bills_cache.invalidate()
     except Exception as e:
-        response = PayResult(bill_id=bill_id, status="failed")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return response
+    return PayResult(bill_id=bill_id, status="paid")
     
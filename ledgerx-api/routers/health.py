@@ -6,5 +6,5 @@ from core.config import settings
 router = APIRouter(prefix=settings.API_PREFIX, tags=["health"])
 
 @router.get("/healthz")
-def healthz():
+async def healthz():
     return {"ok": True}
\ No newline at end of file
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field, EmailStr
 from typing import Literal, Optional
 from core.config import settings
-from db.sqlite3_db import add_bill_source
+from db.database import add_bill_source_async, encrypt_source_password
 
 class BillSourcePayload(BaseModel):
     name: str = Field(..., description="The name of the bill source, e.g. 'Meralco'.")
@@ -25,12 +25,16 @@ class AddSourceResult(BaseModel):
 router = APIRouter(prefix=f"{settings.API_PREFIX}/bill_sources", tags=["bill_sources"])
 
 @router.post("/add", response_model=AddSourceResult)
-def add_bill_source_endpoint(payload: BillSourcePayload):
+async def add_bill_source_endpoint(payload: BillSourcePayload):
+    # flat model of plain fields, so a shallow dict() is enough; model_dump() walks and copies
+    item = dict(payload)
+    # bill_sources stores the password itself, encrypted, rather than the setting's name
     try:
-        add_bill_source(payload.model_dump())
-        response = AddSourceResult(bill_id=payload.name, status="added")
+        item["encrypted_password"] = encrypt_source_password(item.pop("password_env"))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        await add_bill_source_async(item)
     except Exception as e:
-        response = AddSourceResult(bill_id=payload.name, status="failed")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        return response
\ No newline at end of file
+    return AddSourceResult(bill_id=payload.name, status="added")
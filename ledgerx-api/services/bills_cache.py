@@ -0,0 +1,47 @@
+# bills_cache.py
+import asyncio
+import time
+from typing import Any
+
+from db.database import db_all_async
+
+# dashboards poll get_bills; serve repeats from memory for a few seconds
+TTL_SECONDS = 10.0
+
+_rows: list[dict[str, Any]] | None = None
+_expires_at = 0.0
+# bumped by invalidate(); a load that started before the bump must not store its rows
+_generation = 0
+# the query in flight, shared by every caller that misses while it runs
+_loading: asyncio.Task | None = None
+
+
+async def _load(generation: int) -> list[dict[str, Any]]:
+    global _rows, _expires_at, _loading
+    try:
+        rows = await db_all_async()
+        if generation == _generation:
+            _rows, _expires_at = rows, time.monotonic() + TTL_SECONDS
+        return rows
+    finally:
+        if _loading is asyncio.current_task():
+            _loading = None
+
+
+async def get_all_cached() -> list[dict[str, Any]]:
+    global _loading
+    if _rows is not None and time.monotonic() < _expires_at:
+        return _rows
+    if _loading is None:
+        _loading = asyncio.ensure_future(_load(_generation))
+    # shield: one caller giving up must not cancel the query the others are waiting on
+    return await asyncio.shield(_loading)
+
+
+def invalidate() -> None:
+    # only called from the event loop, so no lock is needed
+    global _rows, _generation, _loading
+    _rows = None
+    _generation += 1
+    # callers arriving after this start a fresh query instead of joining the stale one
+    _loading = None
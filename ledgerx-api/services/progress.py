@@ -1,10 +1,18 @@
 # progress.py
 from pydantic import BaseModel, Field
 from enum import Enum
-from typing import Any, Optional
-from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional
+from datetime import datetime, timedelta, timezone
 import asyncio
 
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # redis is optional; only needed with REDIS_URL
+    aioredis = None
+
+# Shared task state expires from Redis an hour after its last write
+REDIS_TTL_SEC = 3600
+
 
 class TaskStatus(str, Enum):
     pending = "pending"
@@ -24,30 +32,106 @@ class TaskProgress(BaseModel):
     updated_at: Optional[str] = None
 
 
-class ProgressTracker:
+def _iso_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+class TaskRegistry:
+    """The one in-memory registry of background tasks: their progress and the asyncio.Task running them."""
+
     def __init__(self):
         self._lock = asyncio.Lock()
         self._tasks: dict[str, TaskProgress] = {}
+        # strong references so running tasks are not garbage collected mid-flight
+        self._handles: dict[str, asyncio.Task] = {}
+        # with several uvicorn workers, state is mirrored to Redis so any worker can answer a poll
+        self._redis = None
+
+    async def connect(self, url: Optional[str]):
+        if not url:
+            return
+        if aioredis is None:
+            raise RuntimeError("REDIS_URL is set but the redis package is not installed")
+        self._redis = aioredis.from_url(url)
+        await self._redis.ping()
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _publish(self, task: TaskProgress):
+        if self._redis is not None:
+            await self._redis.set(f"task:{task.task_id}", task.model_dump_json(), ex=REDIS_TTL_SEC)
+
+    def is_running(self, task_id: str) -> bool:
+        handle = self._handles.get(task_id)
+        return handle is not None and not handle.done()
+
+    def create(self, task_id: str, run: Callable[[], Awaitable[Any]], message: str = None) -> bool:
+        """Schedule run() under task_id unless that id is already running. Returns whether a new run started.
+
+        Checks and claims the id without awaiting in between, so concurrent callers share one run.
+        """
+        if self.is_running(task_id):
+            return False
+        now = _iso_now()
+        self._tasks[task_id] = TaskProgress(
+            task_id=task_id,
+            status=TaskStatus.running,
+            message=message or "Task started",
+            started_at=now,
+            updated_at=now,
+        )
+        handle = asyncio.create_task(self._run(task_id, run))
+        self._handles[task_id] = handle
+        handle.add_done_callback(lambda h: self._forget(task_id, h))
+        return True
+
+    def _forget(self, task_id: str, handle: asyncio.Task):
+        if self._handles.get(task_id) is handle:
+            del self._handles[task_id]
+
+    async def _run(self, task_id: str, run: Callable[[], Awaitable[Any]]):
+        await self._publish(self._tasks[task_id])
+        try:
+            result = await run()
+        except asyncio.CancelledError:
+            await self.fail(task_id, "Task cancelled")
+            raise
+        except Exception as e:
+            await self.fail(task_id, str(e))
+        else:
+            await self.finish(task_id, result)
+
+    def cancel(self, task_id: str) -> bool:
+        if not self.is_running(task_id):
+            return False
+        self._handles[task_id].cancel()
+        return True
 
     async def start(self, task_id: str, message: str = None):
+        now = _iso_now()
         async with self._lock:
             self._tasks[task_id] = TaskProgress(
                 task_id=task_id,
                 status=TaskStatus.running,
                 message=message or "Task started",
-                started_at=datetime.now(timezone.utc).isoformat() + "Z",
-                updated_at=datetime.now(timezone.utc).isoformat() + "Z",
+                started_at=now,
+                updated_at=now,
             )
+        await self._publish(self._tasks[task_id])
 
     async def update_progress(self, task_id: str, progress: float, message: str = None):
-        async with self._lock:
-            if task_id not in self._tasks:
-                return
-            task = self._tasks[task_id]
-            task.progress = min(max(progress, 0.0), 100.0)
-            task.updated_at = datetime.utcnow().isoformat() + "Z"
-            if message:
-                task.message = message
+        # only mutates an existing entry's fields, which never yields to the loop, so no lock
+        task = self._tasks.get(task_id)
+        if task is None:
+            return
+        task.progress = min(max(progress, 0.0), 100.0)
+        task.updated_at = _iso_now()
+        if message:
+            task.message = message
+        await self._publish(task)
 
     async def finish(self, task_id: str, result: Any = None):
         async with self._lock:
@@ -56,7 +140,9 @@ class ProgressTracker:
                 task.status = TaskStatus.done
                 task.progress = 100.0
                 task.result = result
-                task.updated_at = datetime.now(timezone.utc).isoformat() + "Z"
+                task.updated_at = _iso_now()
+        if task:
+            await self._publish(task)
 
     async def fail(self, task_id: str, error: str):
         async with self._lock:
@@ -64,11 +150,35 @@ class ProgressTracker:
             if task:
                 task.status = TaskStatus.error
                 task.error = error
-                task.updated_at = datetime.now(timezone.utc).isoformat() + "Z"
+                task.updated_at = _iso_now()
+        if task:
+            await self._publish(task)
+
+    def get(self, task_id: str) -> Optional[TaskProgress]:
+        # read-only; pollers must not queue behind writers holding the lock
+        return self._tasks.get(task_id)
+
+    async def lookup(self, task_id: str) -> Optional[TaskProgress]:
+        """Like get, but falls back to Redis for tasks owned by another worker."""
+        task = self._tasks.get(task_id)
+        if task is None and self._redis is not None:
+            raw = await self._redis.get(f"task:{task_id}")
+            if raw is not None:
+                task = TaskProgress.model_validate_json(raw)
+        return task
 
-    async def get(self, task_id: str) -> Optional[TaskProgress]:
+    async def cleanup(self, max_age_sec: float = 3600.0):
+        """Forget finished or failed tasks last updated more than max_age_sec ago."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=max_age_sec)).isoformat(timespec="milliseconds")
         async with self._lock:
-            return self._tasks.get(task_id)
+            stale = [
+                task_id for task_id, task in self._tasks.items()
+                if task.status in (TaskStatus.done, TaskStatus.error)
+                and not self.is_running(task_id)
+                and task.updated_at < cutoff
+            ]
+            for task_id in stale:
+                del self._tasks[task_id]
 
 
-PROGRESS = ProgressTracker()
+PROGRESS = TaskRegistry()
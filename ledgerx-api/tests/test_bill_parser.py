@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("dateutil")
+pytest.importorskip("fitz")
+
+from archived.bill_parser import parse_date_any
+
+
+# Expected values are what the original dateutil-only parse_date_any returned
+@pytest.mark.parametrize("text,expected", [
+    ("Statement Date 2025/10/05", "2025-10-05"),
+    ("2025/09/17", "2025-09-17"),
+    ("2025.10.05", "2025-10-05"),
+    ("Due 2025-10-15", "2025-10-15"),
+    ("Payment Due Date 10/15/2025", "2025-10-15"),
+    ("Due 15/10/2025", "2025-10-15"),
+    ("Due 1/2/25", "2025-01-02"),
+    ("Due Oct 15, 2025", "2025-10-15"),
+    ("15 Oct 2025", "2025-10-15"),
+    ("Card 4111-11-2025", None),
+    ("Ref 123/04/2025", None),
+])
+def test_parse_date_any_matches_dateutil(text, expected):
+    assert parse_date_any(text) == expected
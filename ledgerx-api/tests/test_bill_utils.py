@@ -0,0 +1,20 @@
+from decimal import Decimal
+
+import pytest
+
+from utils.bill_utils import parse_money
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("13,927.33", Decimal("13927.33")),
+    ("₱ 1,234.50", Decimal("1234.50")),
+    ("(850.00)", Decimal("-850.00")),
+    ("1,000.00 CR", Decimal("-1000.00")),
+    # NFKC folds full-width digits to ASCII but keeps other decimal digits as they are
+    ("１２３.４５", Decimal("123.45")),
+    ("٣٠٠.٥٠", Decimal("300.50")),
+    ("१,२३४.५०", Decimal("1234.50")),
+    ("12,34.00", None),
+])
+def test_parse_money(text, expected):
+    assert parse_money(text) == expected
@@ -0,0 +1,68 @@
+import asyncio
+
+from services import bills_cache
+
+
+def test_invalidate_during_a_load_keeps_its_rows_out_of_the_cache(monkeypatch):
+    loads = []
+
+    async def db_all_async():
+        loads.append(None)
+        if len(loads) == 1:
+            # the bill is paid while this first query is still in flight
+            bills_cache.invalidate()
+            return [{"id": 1, "status": "unpaid"}]
+        return [{"id": 1, "status": "paid"}]
+
+    monkeypatch.setattr(bills_cache, "db_all_async", db_all_async)
+    monkeypatch.setattr(bills_cache, "_rows", None)
+    monkeypatch.setattr(bills_cache, "_loading", None)
+
+    async def scenario():
+        stale = await bills_cache.get_all_cached()
+        fresh = await bills_cache.get_all_cached()
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale[0]["status"] == "unpaid"
+    assert fresh[0]["status"] == "paid"
+    assert len(loads) == 2
+
+
+def test_repeat_reads_are_served_from_memory(monkeypatch):
+    loads = []
+
+    async def db_all_async():
+        loads.append(None)
+        return [{"id": 1}]
+
+    monkeypatch.setattr(bills_cache, "db_all_async", db_all_async)
+    monkeypatch.setattr(bills_cache, "_rows", None)
+    monkeypatch.setattr(bills_cache, "_loading", None)
+
+    async def scenario():
+        await bills_cache.get_all_cached()
+        await bills_cache.get_all_cached()
+
+    asyncio.run(scenario())
+    assert len(loads) == 1
+
+
+def test_concurrent_misses_share_one_query(monkeypatch):
+    loads = []
+
+    async def db_all_async():
+        loads.append(None)
+        await asyncio.sleep(0.01)
+        return [{"id": 1}]
+
+    monkeypatch.setattr(bills_cache, "db_all_async", db_all_async)
+    monkeypatch.setattr(bills_cache, "_rows", None)
+    monkeypatch.setattr(bills_cache, "_loading", None)
+
+    async def scenario():
+        return await asyncio.gather(*(bills_cache.get_all_cached() for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(loads) == 1
+    assert all(r == [{"id": 1}] for r in results)
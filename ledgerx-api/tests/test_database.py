@@ -0,0 +1,158 @@
+import asyncio
+import queue
+
+import psycopg
+import pytest
+
+from db import database
+
+
+class FakeConn:
+    """Stands in for a psycopg connection; `dead` makes the liveness ping fail."""
+
+    def __init__(self, dead: bool = False):
+        self.closed = False
+        self.broken = False
+        self.dead = dead
+        self.autocommit = False
+
+    def execute(self, query):
+        if self.dead:
+            self.broken = True
+            raise psycopg.OperationalError("server closed the connection unexpectedly")
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    opened = []
+
+    def _connect():
+        opened.append(FakeConn())
+        return opened[-1]
+
+    monkeypatch.setattr(database, "_pool", queue.LifoQueue())
+    monkeypatch.setattr(database, "_opened", 0)
+    monkeypatch.setattr(database, "_connect", _connect)
+    return opened
+
+
+def test_checkout_reuses_a_live_connection(pool):
+    with database.get_conn() as first:
+        pass
+    with database.get_conn() as second:
+        pass
+    assert second is first
+    assert len(pool) == 1
+
+
+def test_checkout_replaces_a_closed_connection(pool):
+    with database.get_conn() as first:
+        pass
+    first.closed = True
+
+    with database.get_conn() as conn:
+        assert conn is not first
+    assert database._opened == 1
+
+
+def test_checkout_pings_long_idle_connections(pool, monkeypatch):
+    stale = FakeConn(dead=True)
+    database._opened = 1
+    database._pool.put((stale, 0.0))
+    monkeypatch.setattr(database.time, "monotonic", lambda: database.IDLE_CHECK_SEC + 1)
+
+    with database.get_conn() as conn:
+        assert conn is pool[0]
+    assert stale.closed
+    assert database._opened == 1
+
+
+def test_dead_connection_frees_its_slot_in_a_full_pool(pool, monkeypatch):
+    monkeypatch.setattr(database, "POOL_SIZE", 1)
+    with database.get_conn() as first:
+        pass
+    first.broken = True
+
+    # the broken connection gives its slot back, so the pool stays at one
+    with database.get_conn() as conn:
+        assert conn is pool[1]
+    assert database._opened == 1
+
+
+class FakeAsyncConn(FakeConn):
+    async def execute(self, query):
+        FakeConn.execute(self, query)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def apool(monkeypatch):
+    """Async pool whose connects fail while `state["down"]` is set."""
+    state = {"down": False, "opened": []}
+
+    async def _aconnect():
+        if state["down"]:
+            raise psycopg.OperationalError("connection refused")
+        state["opened"].append(FakeAsyncConn())
+        return state["opened"][-1]
+
+    monkeypatch.setattr(database, "_apool", None)
+    monkeypatch.setattr(database, "_aconnect", _aconnect)
+    return state
+
+
+def test_async_pool_opens_while_the_database_is_down(apool):
+    async def scenario():
+        apool["down"] = True
+        await database.open_async_pool()
+
+        with pytest.raises(psycopg.OperationalError):
+            async with database.get_async_conn():
+                pass
+
+        apool["down"] = False
+        async with database.get_async_conn() as conn:
+            assert conn is apool["opened"][0]
+        assert database._apool.qsize() == database.ASYNC_POOL_SIZE
+        await database.close_async_pool()
+
+    asyncio.run(scenario())
+
+
+def test_async_pool_keeps_the_slot_of_a_dead_connection(apool, monkeypatch):
+    monkeypatch.setattr(database, "ASYNC_POOL_SIZE", 1)
+
+    async def scenario():
+        await database.open_async_pool()
+        async with database.get_async_conn() as conn:
+            conn.broken = True
+
+        apool["down"] = True
+        with pytest.raises(psycopg.OperationalError):
+            async with database.get_async_conn():
+                pass
+        assert database._apool.qsize() == database.ASYNC_POOL_SIZE
+
+        apool["down"] = False
+        async with database.get_async_conn() as conn:
+            assert not conn.broken
+        await database.close_async_pool()
+
+    asyncio.run(scenario())
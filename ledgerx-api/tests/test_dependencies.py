@@ -0,0 +1,47 @@
+import jwt
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from core import dependencies
+from core.config import settings
+
+SECRET = settings.JWT_SECRET
+
+def _request(token: str) -> Request:
+    return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+
+@pytest.fixture(autouse=True)
+def _empty_users():
+    dependencies.USERS.clear()
+    dependencies.USERS_BY_ID.clear()
+
+
+def test_auth_user_finds_registered_user_by_token_subject():
+    user = dependencies.register_user({"id": "1001", "email": "ana@example.com", "name": "Ana"})
+    token = jwt.encode({"sub": "1001"}, SECRET, algorithm="HS256")
+
+    assert dependencies.auth_user(_request(token)) is user
+    assert dependencies.USERS["ana@example.com"] is user
+
+
+def test_register_user_drops_the_old_id_when_an_email_is_re_registered():
+    dependencies.register_user({"id": "1001", "email": "ana@example.com"})
+    dependencies.register_user({"id": "2002", "email": "ana@example.com"})
+
+    assert set(dependencies.USERS_BY_ID) == {"2002"}
+
+
+@pytest.mark.parametrize("token,detail", [
+    (jwt.encode({"sub": "404"}, SECRET, algorithm="HS256"), "User not found"),
+    (jwt.encode({"sub": "1001"}, "another-" + SECRET, algorithm="HS256"), "Invalid token"),
+    (jwt.encode({"name": "no subject"}, SECRET, algorithm="HS256"), "Invalid token"),
+])
+def test_auth_user_rejects_unknown_or_bad_tokens(token, detail):
+    dependencies.register_user({"id": "1001", "email": "ana@example.com"})
+
+    with pytest.raises(HTTPException) as exc:
+        dependencies.auth_user(_request(token))
+    assert exc.value.status_code == 401
+    assert exc.value.detail == detail
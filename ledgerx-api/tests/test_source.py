@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core.config import settings
+from routers import source
+from utils.password_crypto import decrypt_password
+
+PAYLOAD = {
+    "name": "BPI Rewards",
+    "provider": "gmail",
+    "gmail_query": "from:ebillservice@bpi.com.ph has:attachment",
+    "sender_email": "ebillservice@bpi.com.ph",
+    "file_pattern": "BPI_Rewards_{month}_{year}.pdf",
+    "currency": "PHP",
+    "category": "credit_card",
+}
+
+
+@pytest.fixture
+def added(monkeypatch):
+    """Capture what the endpoint hands to the database layer."""
+    items = []
+
+    async def _add(item):
+        items.append(item)
+
+    monkeypatch.setattr(source, "add_bill_source_async", _add)
+    return items
+
+
+@pytest.fixture
+def client():
+    # no context manager: lifespan (DB pool, Redis, CPU workers) is not needed here
+    return TestClient(main.app)
+
+
+def test_password_env_is_stored_encrypted(client, added, monkeypatch):
+    monkeypatch.setitem(settings.model_extra, "BPI_PDF_PASSWORD", "20Oct1997")
+
+    res = client.post("/api/v1/bill_sources/add", json={**PAYLOAD, "password_env": "BPI_PDF_PASSWORD"})
+
+    assert res.status_code == 200
+    (item,) = added
+    assert "password_env" not in item
+    assert decrypt_password(item["encrypted_password"]) == "20Oct1997"
+
+
+@pytest.mark.parametrize("password_env", [None, "None"])
+def test_source_without_password_stores_none(client, added, password_env):
+    res = client.post("/api/v1/bill_sources/add", json={**PAYLOAD, "password_env": password_env})
+
+    assert res.status_code == 200
+    assert added[0]["encrypted_password"] is None
+
+
+def test_unknown_password_env_is_rejected(client, added):
+    res = client.post("/api/v1/bill_sources/add", json={**PAYLOAD, "password_env": "NO_SUCH_SETTING"})
+
+    assert res.status_code == 422
+    assert added == []
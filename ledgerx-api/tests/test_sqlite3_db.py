@@ -0,0 +1,95 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from db import sqlite3_db
+
+# bills as the first release created it: unique on (name, due_date) only
+_BASELINE_BILLS = """
+CREATE TABLE bills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    due_date TEXT,
+    sent_date TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    amount TEXT,
+    currency TEXT DEFAULT 'PHP',
+    status TEXT DEFAULT 'unpaid',
+    source_email_id TEXT,
+    drive_file_id TEXT,
+    drive_file_name TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+    paid_at TEXT,
+    category TEXT,
+    notes TEXT,
+    UNIQUE(name, due_date)
+)
+"""
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "ledgerx.db"
+    monkeypatch.setattr(sqlite3_db, "get_settings", lambda: SimpleNamespace(DB_PATH=path, DEFAULT_SOURCES_PATH=None))
+    sqlite3_db._tls.conn = None
+    yield path
+    sqlite3_db.close_conn()
+
+
+def test_db_init_dedupes_bills_from_the_old_schema(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(_BASELINE_BILLS)
+        conn.executemany(
+            "INSERT INTO bills (name, due_date, sent_date, status) VALUES (?, ?, ?, ?)",
+            [
+                ("BPI Rewards", "2025-09-17", "2025-09-01T00:30:00Z", "unpaid"),
+                ("BPI Rewards", "September 17, 2025", "2025-09-01T00:30:00Z", "paid"),
+                ("Meralco", "2025-09-20", "2025-09-02T01:00:00Z", "unpaid"),
+            ],
+        )
+    conn.close()
+
+    sqlite3_db.db_init()
+
+    conn = sqlite3_db._conn()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == sqlite3_db.SCHEMA_VERSION
+    rows = conn.execute("SELECT name, status FROM bills ORDER BY name").fetchall()
+    assert rows == [("BPI Rewards", "paid"), ("Meralco", "unpaid")]
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'last_run'").fetchone()
+
+
+def test_failed_upgrade_rolls_back_under_wal(db_path, monkeypatch):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(_BASELINE_BILLS)
+        conn.execute("INSERT INTO bills (name, due_date) VALUES ('Meralco', '2025-09-20')")
+    conn.close()
+    monkeypatch.setattr(sqlite3_db, "_SCHEMA_DDL", sqlite3_db._SCHEMA_DDL + "\nINSERT INTO no_such_table VALUES (1);")
+    conn = sqlite3_db._conn()
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    with pytest.raises(sqlite3.OperationalError):
+        sqlite3_db.db_init()
+
+    conn.set_trace_callback(None)
+    # an existing database is migrated with its journal, so the ROLLBACK is well defined
+    assert not any("journal_mode=OFF" in s for s in statements)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    # the whole DDL script was undone, not just the failing statement
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'last_run'").fetchone() is None
+    assert conn.execute("SELECT count(*) FROM bills").fetchone()[0] == 1
+
+
+def test_fresh_database_ends_up_in_wal(db_path):
+    conn = sqlite3_db._conn()
+    statements = []
+    conn.set_trace_callback(statements.append)
+
+    sqlite3_db.db_init()
+
+    conn.set_trace_callback(None)
+    assert any("journal_mode=OFF" in s for s in statements)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == sqlite3_db.SCHEMA_VERSION
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
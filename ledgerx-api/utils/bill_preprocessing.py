@@ -8,10 +8,14 @@ from utils.password_crypto import decrypt_password
 from utils.pattern_field_extractor import pattern_field_extraction
 from utils.pdf_extract_text import get_text_from_pdf
 import html
+import os
 import pikepdf
 import re
 import tempfile
 
+# Decrypted copies only live for one bill; keep them on tmpfs (RAM) where the OS has it
+_TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
 # -------------------------------
 # Helpers: decrypt + preprocessing
 # -------------------------------
@@ -26,7 +30,9 @@ def decrypt_to_temp(value: Dict[str, Any]) -> str:
         useful_page: 1-based page numbers to extract. Defaults to [1].
 
     Returns:
-        Path to the temporary decrypted PDF.
+        Path to the temporary decrypted PDF, or the input path itself when it is
+        unencrypted and every page is selected. Callers delete only a path that
+        differs from value['bills_path'].
 
     Raises:
         FileNotFoundError: If the input PDF does not exist.
@@ -38,11 +44,13 @@ def decrypt_to_temp(value: Dict[str, Any]) -> str:
         raise FileNotFoundError(f"Input file not found: {src}")
 
     try:
-        open_kwargs = {"password": decrypt_password(value.get('encrypted_password'))} if value.get('encrypted_password') is not None else {}
+        # callers processing many bills of one source pass the decrypted password along
+        password = value['password'] if 'password' in value else (
+            decrypt_password(value['encrypted_password']) if value.get('encrypted_password') is not None else None
+        )
+        open_kwargs = {"password": password} if password is not None else {}
 
         with pikepdf.open(str(src), **open_kwargs) as pdf:
-            new_pdf = pikepdf.Pdf.new()
-
             if value.get('name') == "BPI Rewards" and len(pdf.pages) >= 6:
                 pages_to_extract = [3] 
             else:
@@ -53,26 +61,34 @@ def decrypt_to_temp(value: Dict[str, Any]) -> str:
             if not all(isinstance(pg, int) and pg >= 1 for pg in pages_to_extract):
                 raise ValueError("All page numbers in useful_page must be positive integers.")
 
-            for pg in pages_to_extract:
-                if pg > len(pdf.pages):
-                    continue
-                new_pdf.pages.append(pdf.pages[pg - 1])
-
-            if len(new_pdf.pages) == 0:
+            selected = [pg for pg in pages_to_extract if pg <= len(pdf.pages)]
+            if not selected:
                 raise ValueError(
                     f"No valid pages selected. PDF has {len(pdf.pages)} page(s), "
                     f"but requested pages were: {pages_to_extract}"
                 )
 
+            if selected == list(range(1, len(pdf.pages) + 1)):
+                # every page, in order: nothing to copy
+                if not pdf.is_encrypted:
+                    return str(src)
+                out_pdf = pdf  # saving drops the encryption
+            else:
+                out_pdf = pikepdf.Pdf.new()
+                for pg in selected:
+                    out_pdf.pages.append(pdf.pages[pg - 1])
+
             fd, tmp_name = tempfile.mkstemp(
                 prefix=src.stem + ".",
-                suffix=".decrypted.tmp.pdf"
+                suffix=".decrypted.tmp.pdf",
+                dir=_TMP_DIR,
             )
+            os.close(fd)
             Path(tmp_name).unlink(missing_ok=True)  # remove empty file created by mkstemp
 
             tmp_path = Path(tmp_name)
             try:
-                new_pdf.save(str(tmp_path))
+                out_pdf.save(str(tmp_path))
             except Exception:
                 tmp_path.unlink(missing_ok=True)
                 raise
@@ -1,4 +1,4 @@
-from decimal import Decimal, ROUND_HALF_EVEN, InvalidOperation
+from decimal import Decimal, ROUND_HALF_EVEN
 import unicodedata
 from datetime import datetime
 import re
@@ -26,9 +26,30 @@ _MONEY_RE = re.compile(
     (?P<suf>CR|DR)?        # optional CR/DR
     \s*$
     """,
-    re.VERBOSE
+    re.VERBOSE  # Unicode \d: NFKC leaves Arabic-Indic and other decimal digits as they are
 )
 
+_CENT = Decimal("0.01")
+_HUNDRED = Decimal(100)
+
+def _plain_cents(s: str):
+    """Integer cents for a bare ASCII amount such as '13,927.33' or '850', else None.
+
+    Accepts exactly what _MONEY_RE accepts without sign, currency or CR/DR, so the
+    common OCR output skips NFKC normalization and the full regex.
+    """
+    if not s.isascii():
+        return None
+    whole, dot, frac = s.partition(".")
+    if dot and not (1 <= len(frac) <= 2 and frac.isdigit()):
+        return None
+    groups = whole.split(",")
+    if not all(g.isdigit() for g in groups):
+        return None
+    if len(groups) > 1 and not (len(groups[0]) <= 3 and all(len(g) == 3 for g in groups[1:])):
+        return None
+    return int("".join(groups)) * 100 + int(frac.ljust(2, "0") if dot else "0")
+
 DATE_FORMATS = [
     "%Y-%m-%d",          # 2026-02-18
     "%B %d, %Y",         # January 28, 2026
@@ -60,18 +81,22 @@ def parse_money(s: str, *, return_cents: bool = False):
 
     if isinstance(s, Decimal):
         q = s
-        q = q.quantize(Decimal("0.01"), rounding=ROUND_HALF_EVEN)
-        return int((q * 100).to_integral_value(rounding=ROUND_HALF_EVEN)) if return_cents else q
+        q = q.quantize(_CENT, rounding=ROUND_HALF_EVEN)
+        return int((q * _HUNDRED).to_integral_value(rounding=ROUND_HALF_EVEN)) if return_cents else q
 
     if isinstance(s, int):
-        q = Decimal(s).quantize(Decimal("0.01"), rounding=ROUND_HALF_EVEN)
-        return int((q * 100).to_integral_value(rounding=ROUND_HALF_EVEN)) if return_cents else q
+        q = Decimal(s).quantize(_CENT, rounding=ROUND_HALF_EVEN)
+        return int((q * _HUNDRED).to_integral_value(rounding=ROUND_HALF_EVEN)) if return_cents else q
 
     if isinstance(s, float):
-        q = Decimal(str(s)).quantize(Decimal("0.01"), rounding=ROUND_HALF_EVEN)
-        return int((q * 100).to_integral_value(rounding=ROUND_HALF_EVEN)) if return_cents else q
+        q = Decimal(str(s)).quantize(_CENT, rounding=ROUND_HALF_EVEN)
+        return int((q * _HUNDRED).to_integral_value(rounding=ROUND_HALF_EVEN)) if return_cents else q
 
     s = str(s).strip()
+    cents = _plain_cents(s)
+    if cents is not None:
+        return cents if return_cents else Decimal(cents).scaleb(-2)
+
     s = unicodedata.normalize("NFKC", s)
 
     paren_neg = s.startswith("(") and s.endswith(")")
@@ -83,27 +108,17 @@ def parse_money(s: str, *, return_cents: bool = False):
         return None
 
     sign = m.group("sign") or ""
-    num = m.group("num").replace(",", "")
     suf = (m.group("suf") or "").upper()
-    frac = m.group(4)
-
-    try:
-        q = Decimal(num + (("." + frac) if frac else ""))
-    except InvalidOperation:
-        return None
-
-    is_credit_negative = (suf == "CR")
-    is_debit_positive = (suf == "DR")
-    negative = paren_neg or (sign == "-") or is_credit_negative
-
-    if negative and not is_debit_positive:
-        q = -q
+    # the regex allows at most two decimals, so whole cents are exact and need no rounding
+    cents = int(m.group("num").replace(",", "")) * 100 + int((m.group(4) or "").ljust(2, "0"))
 
-    q = q.quantize(Decimal("0.01"), rounding=ROUND_HALF_EVEN)
+    # parentheses, a minus or CR make it negative unless it is marked DR
+    if (paren_neg or sign == "-" or suf == "CR") and suf != "DR":
+        cents = -cents
 
     if return_cents:
-        return int((q * 100).to_integral_value(rounding=ROUND_HALF_EVEN))
-    return q
+        return cents
+    return Decimal(cents).scaleb(-2)
 
 
 def get_ph_time(from_datatime: str = None):
@@ -1,11 +1,16 @@
 from cryptography.fernet import Fernet
-from core.config import settings
+from core.config import get_settings
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _fernet() -> Fernet:
+    return Fernet(get_settings().FERNET_KEY)
 
-fernet = Fernet(settings.FERNET_KEY)
 
 def encrypt_password(password: str) -> bytes:
-    return fernet.encrypt(password.encode())
+    return _fernet().encrypt(password.encode())
 
 
 def decrypt_password(token: bytes) -> str:
-    return fernet.decrypt(token).decode()
\ No newline at end of file
+    return _fernet().decrypt(token).decode()
\ No newline at end of file
@@ -14,8 +14,15 @@ import streamlit as st
 import plotly.express as px
 from config import settings
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional
+    from json import loads as json_loads
+
 try:
     import requests  # optional for live API fetch
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except Exception:
     requests = None
 
@@ -55,45 +62,101 @@ def _peso(x: Any) -> str:
         return str(x)
 
 
-def _parse_date(x: Optional[str]) -> Optional[date]:
-    if not x:
-        return None
-    try:
-        # supports 'YYYY-MM-DD' and 'YYYY-MM-DD hh:mm:ss' and ISO with Z
-        return pd.to_datetime(str(x).rstrip("Z"), errors="coerce").date()
-    except Exception:
-        return None
+# Bill dates are shown in the API's local time (see get_ph_time in ledgerx-api)
+_LOCAL_TZ = "Asia/Manila"
+# a UTC offset or Z after a time of day, e.g. '2025-09-18 10:15:00+08:00' from a TIMESTAMPTZ column
+_TZ_OFFSET = r"[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})$"
+
+
+def _parse_dates(s: pd.Series) -> pd.Series:
+    # supports 'YYYY-MM-DD' and 'YYYY-MM-DD hh:mm:ss' and ISO with Z or an offset; vectorized,
+    # kept as tz-naive local datetime64 (call .dt.date only when rendering). Offset-bearing
+    # values are converted to local time and made naive, so every date column has one dtype
+    # and can be subtracted, grouped by month and written to Excel.
+    text = s.astype(str)
+    has_tz = text.str.contains(_TZ_OFFSET, regex=True)
+    out = pd.to_datetime(text.where(~has_tz), errors="coerce", format="ISO8601")
+    if has_tz.any():
+        out.loc[has_tz] = (
+            pd.to_datetime(text[has_tz], errors="coerce", format="ISO8601", utc=True)
+              .dt.tz_convert(_LOCAL_TZ)
+              .dt.tz_localize(None)
+        )
+    return out
+
+
+@st.cache_resource
+def _session() -> "requests.Session":
+    """One keep-alive Session per server process, so reruns reuse the API connection."""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2))
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+_BILL_FIELDS = ("id", "name", "due_date", "sent_date", "paid_at", "amount", "status", "category", "drive_file_name", "notes")
+
+
+def _empty_utils() -> pd.DataFrame:
+    """Zero-row utilities frame with the final schema (the API usually returns only credit cards)."""
+    return pd.DataFrame({
+        "provider": pd.Series(dtype="string[pyarrow]"),
+        "bill_period_start": pd.Series(dtype="datetime64[ns]"),
+        "bill_period_end": pd.Series(dtype="datetime64[ns]"),
+        "due_date": pd.Series(dtype="datetime64[ns]"),
+        "amount": pd.Series(dtype="float64"),
+        "status": pd.Series(dtype="string[pyarrow]"),
+        "paid_date": pd.Series(dtype="datetime64[ns]"),
+        "method": pd.Series(dtype="object"),
+        "remarks": pd.Series(dtype="string[pyarrow]"),
+        "pdf_path": pd.Series(dtype="string[pyarrow]"),
+        "_is_paid": pd.Series(dtype=bool),
+        "_period": pd.Series(dtype="string"),
+    })
 
 
-def transform_api_to_frames(api_json: Dict[str, Any]) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_bills(url: str) -> Dict[str, Any]:
+    """GET the /bills payload; cached briefly so reruns don't re-hit the API."""
+    resp = _session().get(url, timeout=20)
+    resp.raise_for_status()
+    return json_loads(resp.content)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def transform_api_to_frames(api_text: str) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """Transform your /bills API payload into the tables used by the report.
-    Returns (cards_df, utilities_df, raw_df, history_df)
+    Takes the payload as a JSON string (json.dumps(..., sort_keys=True)) so reruns hit the cache.
+    Returns (cards_df, utilities_df, raw_df, history_df, alerts_df)
     """
+    api_json = json_loads(api_text)
     bills = api_json.get("bills", []) or []
-    df = pd.DataFrame(bills)
-
-    # Normalize/ensure columns exist
-    for col in ["due_date", "sent_date", "paid_at", "created_at"]:
-        if col in df.columns:
-            df[col] = df[col].astype(str)
+    # Only the fields the report reads, built column-wise; absent ones become all-None columns
+    df = pd.DataFrame({k: [b.get(k) for b in bills] for k in _BILL_FIELDS}, copy=False)
+    # Arrow-backed strings (pyarrow ships with streamlit) keep .str/.eq in Arrow kernels
+    for c in ("name", "status", "category", "drive_file_name", "notes"):
+        df[c] = df[c].astype("string[pyarrow]")
 
     # Derive common fields
-    df["due_date_d"] = df["due_date"].apply(_parse_date)
-    df["sent_date_d"] = df["sent_date"].apply(_parse_date)
-    df["paid_date_d"] = df.get("paid_at", pd.Series([None]*len(df))).apply(_parse_date)
+    df["due_date_d"] = _parse_dates(df["due_date"])
+    df["sent_date_d"] = _parse_dates(df["sent_date"])
+    df["paid_date_d"] = _parse_dates(df["paid_at"])
 
     # Amount as float
-    if "amount" in df.columns:
-        df["amount_f"] = pd.to_numeric(df["amount"], errors="coerce")
-    else:
-        df["amount_f"] = 0.0
+    df["amount_f"] = pd.to_numeric(df["amount"], errors="coerce")
+    # Paid flag computed once; cards/utils carry it so the summary never re-lowers status
+    df["_is_paid"] = df["status"].fillna("").str.lower().eq("paid").to_numpy(dtype=bool)
 
     # Split by category; your sample only has credit_card, but we'll keep it generic
-    cards_raw = df.loc[df["category"].fillna("").str.lower().eq("credit_card")].copy()
-    utils_raw = df.loc[~df["category"].fillna("").str.lower().eq("credit_card")].copy()
+    is_card = df["category"].fillna("").str.lower().eq("credit_card")
+    cards_raw = df.loc[is_card].copy()
+    utils_raw = df.loc[~is_card].copy()
 
     # ---- Credit Cards table mapping ----
     # Map API → report schema
+    amt = cards_raw["amount_f"].to_numpy(dtype=np.float64, na_value=np.nan)
+    is_paid = cards_raw["_is_paid"].to_numpy()
     cards = pd.DataFrame({
         "id": cards_raw.get("id"),
         "card": cards_raw.get("name"),
@@ -103,18 +166,22 @@ def transform_api_to_frames(api_json: Dict[str, Any]) -> tuple[pd.DataFrame, pd.
         "due_date": cards_raw.get("due_date_d"),
         "total_due": cards_raw.get("amount_f"),
         "min_due": np.nan,  # not provided by API
-        "amount_paid": np.where(cards_raw.get("status", "").str.lower().eq("paid"), cards_raw.get("amount_f"), 0.0),
+        "amount_paid": np.where(is_paid, amt, 0.0),
         "payment_date": cards_raw.get("paid_date_d"),
-        "remaining_balance": np.where(cards_raw.get("status", "").str.lower().eq("paid"), 0.0, cards_raw.get("amount_f")),
+        "remaining_balance": np.where(is_paid, 0.0, amt),
         "remarks": cards_raw.get("notes"),
         "auto_debit": False,  # unknown from API
         "pdf_path": cards_raw.get("drive_file_name"),
     })
+    cards["_is_paid"] = is_paid
+    # Report month per row, computed once; the page filters on it with .eq(sel_month)
+    cards["_period"] = cards["statement_date"].dt.to_period("M").astype("string")
 
     # ---- Utilities & Subscriptions mapping ----
     # Your API doesn't supply these fields yet; derive a minimal table if any non-CC exist
-    utils = pd.DataFrame()
-    if not utils_raw.empty:
+    if utils_raw.empty:
+        utils = _empty_utils()
+    else:
         utils = pd.DataFrame({
             "provider": utils_raw.get("name"),
             "bill_period_start": utils_raw.get("sent_date_d"),  # best-effort proxy
@@ -127,6 +194,8 @@ def transform_api_to_frames(api_json: Dict[str, Any]) -> tuple[pd.DataFrame, pd.
             "remarks": utils_raw.get("notes"),
             "pdf_path": utils_raw.get("drive_file_name"),
         })
+        utils["_is_paid"] = utils_raw["_is_paid"].to_numpy()
+        utils["_period"] = utils["due_date"].dt.to_period("M").astype("string")
 
     # ---- Raw Extract Appendix ----
     raw = pd.DataFrame({
@@ -134,36 +203,38 @@ def transform_api_to_frames(api_json: Dict[str, Any]) -> tuple[pd.DataFrame, pd.
         "sent_date": df.get("sent_date_d"),
         "path": df.get("drive_file_name"),
         "extracted_fields": None,
-        "success": np.where(df.get("status", "").str.lower().eq("paid"), 1, 1),  # extraction success unknown
+        "success": 1,  # extraction success unknown
         "duration_sec": None,
     })
 
     # ---- History (monthly aggregates) ----
-    # Build a small history from available records by month using sent_date as statement proxy
-    if not cards.empty:
-        cards_hist = (
-            cards.assign(month=pd.to_datetime(cards["statement_date"]).dt.to_period("M").astype(str))
-                 .groupby("month", dropna=True)["total_due"].sum()
-                 .rename("credit_cards")
-        )
-    else:
-        cards_hist = pd.Series(dtype=float)
+    # Build a small history from available records by month using sent_date as statement proxy;
+    # both sources go into one long frame so a single pivot does the grouping
+    parts = [pd.DataFrame({"month": cards["_period"], "kind": "credit_cards", "amount": cards["total_due"]})]
     if not utils.empty:
-        utils_hist = (
-            utils.assign(month=pd.to_datetime(utils["due_date"]).dt.to_period("M").astype(str))
-                 .groupby("month", dropna=True)["amount"].sum()
-                 .rename("utilities")
-        )
-    else:
-        utils_hist = pd.Series(dtype=float)
-    hist = pd.concat([cards_hist, utils_hist], axis=1).fillna(0.0)
-    if hist.empty:
+        parts.append(pd.DataFrame({"month": utils["_period"], "kind": "utilities", "amount": utils["amount"]}))
+    long = pd.concat(parts, ignore_index=True).dropna(subset=["month"])
+    if long.empty:
         hist = pd.DataFrame({"month": [], "credit_cards": [], "utilities": [], "total": []})
     else:
-        hist = hist.reset_index().rename(columns={"index": "month"})
-        hist["total"] = hist.get("credit_cards", 0.0) + hist.get("utilities", 0.0)
+        hist = (
+            long.pivot_table(index="month", columns="kind", values="amount", aggfunc="sum", fill_value=0.0)
+                .reindex(columns=["credit_cards", "utilities"], fill_value=0.0)
+                .rename_axis(columns=None)
+                .reset_index()
+        )
+        hist["total"] = hist["credit_cards"] + hist["utilities"]
+
+    # ---- Alerts (all months; the page slices by _period, the export takes them all) ----
+    # days_left is as of the cache fill, so it can lag by at most the cache ttl
+    alert_parts = [cards[["card", "due_date", "total_due", "_period"]].rename(columns={"card": "bill", "total_due": "amount"})]
+    if not utils.empty:
+        alert_parts.append(utils[["provider", "due_date", "amount", "_period"]].rename(columns={"provider": "bill"}))
+    alerts = pd.concat(alert_parts, ignore_index=True)
+    alerts["days_left"] = (alerts["due_date"] - pd.Timestamp(date.today())).dt.days
+    alerts["status"] = np.select([alerts["days_left"] < 0, alerts["days_left"] <= 7], ["Overdue", "Due soon"], default="Pending")
 
-    return cards, utils, raw, hist
+    return cards, utils, raw, hist, alerts
 
 
 # -----------------------------
@@ -205,9 +276,7 @@ with st.sidebar:
         # Manual fetch button
         if go:
             try:
-                resp = requests.get(url, timeout=20)
-                resp.raise_for_status()
-                st.session_state["api_json"] = resp.json()
+                st.session_state["api_json"] = fetch_bills(url)
                 st.session_state["last_url"] = url
                 st.session_state["auto_fetch_done"] = True
                 st.success("Fetched successfully.")
@@ -221,9 +290,7 @@ with st.sidebar:
             and url
         ):
             try:
-                resp = requests.get(url, timeout=20)
-                resp.raise_for_status()
-                st.session_state["api_json"] = resp.json()
+                st.session_state["api_json"] = fetch_bills(url)
                 st.session_state["auto_fetch_done"] = True
                 st.info(f"Auto-fetched data from {url}")
             except Exception as e:
@@ -236,53 +303,48 @@ if not api_json:
     st.stop()
 
 # Transform
-cards_m, utils_m, raw_view, hist = transform_api_to_frames(api_json)
+cards_m, utils_m, raw_view, hist, alerts_m = transform_api_to_frames(json.dumps(api_json, sort_keys=True))
 
-# Month selector driven by available dates
-all_dates = pd.concat([
-    pd.to_datetime(cards_m.get("statement_date"), errors="coerce"),
-    pd.to_datetime(utils_m.get("due_date"), errors="coerce")
-]).dropna()
-
-if all_dates.empty:
-    default_period = pd.Period(date.today(), freq="M")
-    period_options = [str(default_period)]
-else:
-    months = sorted(all_dates.dt.to_period("M").astype(str).unique())
-    period_options = months
+# Month selector driven by the precomputed report months
+months = set(cards_m["_period"].dropna())
+if not utils_m.empty:
+    months |= set(utils_m["_period"].dropna())
+period_options = sorted(months) or [str(pd.Period(date.today(), freq="M"))]
 
 sel_month = st.selectbox("Report Month", options=period_options, index=len(period_options)-1)
 
 # Filter by selected month
-mask_cards = pd.to_datetime(cards_m["statement_date"], errors="coerce").dt.to_period("M").astype(str).eq(sel_month)
-mask_utils = pd.to_datetime(utils_m.get("due_date"), errors="coerce").dt.to_period("M").astype(str).eq(sel_month) if not utils_m.empty else pd.Series([], dtype=bool)
+# _period is a nullable string column; rows without a date never match
+mask_cards = cards_m["_period"].eq(sel_month).fillna(False)
 cards_month = cards_m.loc[mask_cards].copy()
-utils_month = utils_m.loc[mask_utils].copy() if not utils_m.empty else pd.DataFrame(columns=["amount", "status", "due_date", "provider", "paid_date", "method", "remarks", "pdf_path"]) 
+# utils_m always has the full schema; with no utilities rows it is used as-is
+utils_month = utils_m.loc[utils_m["_period"].eq(sel_month).fillna(False)].copy() if not utils_m.empty else utils_m
 
 # -----------------------------
 # 1) Summary Dashboard
 # -----------------------------
 st.subheader("1) Summary Dashboard")
 
-this_month_paid = (cards_month.get("amount_paid", pd.Series(0.0)).sum() + utils_month.get("amount", pd.Series(0.0)).where(utils_month.get("status", "").str.lower().eq("paid"), 0.0).sum())
+this_month_paid = float(cards_month["amount_paid"].sum()) + (float(utils_month.loc[utils_month["_is_paid"], "amount"].sum()) if not utils_month.empty else 0.0)
 last_month = str((pd.Period(sel_month, freq="M") - 1))
-mask_cards_prev = pd.to_datetime(cards_m["statement_date"], errors="coerce").dt.to_period("M").astype(str).eq(last_month)
-mask_utils_prev = pd.to_datetime(utils_m.get("due_date"), errors="coerce").dt.to_period("M").astype(str).eq(last_month) if not utils_m.empty else pd.Series([], dtype=bool)
-last_month_paid = (cards_m.loc[mask_cards_prev, "amount_paid"].sum() + utils_m.loc[mask_utils_prev & utils_m.get("status", "").str.lower().eq("paid"), "amount"].sum()) if not utils_m.empty else cards_m.loc[mask_cards_prev, "amount_paid"].sum()
+mask_cards_prev = cards_m["_period"].eq(last_month).fillna(False)
+last_month_paid = float(cards_m.loc[mask_cards_prev, "amount_paid"].sum())
+if not utils_m.empty:
+    last_month_paid += float(utils_m.loc[utils_m["_period"].eq(last_month).fillna(False) & utils_m["_is_paid"], "amount"].sum())
 
 credit_total_due = cards_month.get("total_due", pd.Series(0.0)).sum()
-utilities_total_due = utils_month.get("amount", pd.Series(0.0)).sum()
+utilities_total_due = utils_month["amount"].sum()
 
 # Upcoming 7 days (from today)
 _today = date.today()
 upcoming_7 = (
-    cards_month.loc[(pd.to_datetime(cards_month["due_date"]).dt.date >= _today) & (pd.to_datetime(cards_month["due_date"]).dt.date <= _today + timedelta(days=7)), "total_due"].sum()
-    + utils_month.loc[(pd.to_datetime(utils_month["due_date"]).dt.date >= _today) & (pd.to_datetime(utils_month["due_date"]).dt.date <= _today + timedelta(days=7)), "amount"].sum()
+    cards_month.loc[(cards_month["due_date"].dt.date >= _today) & (cards_month["due_date"].dt.date <= _today + timedelta(days=7)), "total_due"].sum()
+    + (utils_month.loc[(utils_month["due_date"].dt.date >= _today) & (utils_month["due_date"].dt.date <= _today + timedelta(days=7)), "amount"].sum() if not utils_month.empty else 0.0)
 )
 
 # Avg delay (only utilities have paid_date/due_date reliably; cards use payment_date)
-util_delays = (pd.to_datetime(utils_month.get("paid_date"), errors="coerce") - pd.to_datetime(utils_month.get("due_date"), errors="coerce")).dt.days.dropna()
-card_delays = (pd.to_datetime(cards_month.get("payment_date"), errors="coerce") - pd.to_datetime(cards_month.get("due_date"), errors="coerce")).dt.days.dropna()
+util_delays = (utils_month["paid_date"] - utils_month["due_date"]).dt.days.dropna()
+card_delays = (cards_month["payment_date"] - cards_month["due_date"]).dt.days.dropna()
 all_delays = pd.concat([util_delays, card_delays])
 avg_delay = all_delays.mean() if not all_delays.empty else np.nan
 
@@ -310,7 +372,7 @@ cc_cols = ["card","statement_date","due_date","total_due","payment_date","remain
 show_cards = cards_month.copy()
 for c in ["statement_date","due_date","payment_date"]:
     if c in show_cards:
-        show_cards[c] = pd.to_datetime(show_cards[c], errors="coerce").dt.date.astype(str)
+        show_cards[c] = show_cards[c].dt.date.astype(str)
 
 #st.dataframe(
 #    show_cards[ [c for c in cc_cols if c in show_cards.columns] ]
@@ -323,85 +385,100 @@ for c in ["statement_date","due_date","payment_date"]:
 #    hide_index=True,
 #)
 import os
-st.markdown("### Bills")
-header = st.columns([3, 2, 2, 1.5, 2, 2])
-header[0].markdown("**Name**")
-header[1].markdown("**Due Date**")
-header[2].markdown("**Amount**")
-header[3].markdown("**Status**")
-header[4].markdown("**PDF**")
-header[5].markdown("**Action**")
-
-for _, row in cards_month.iterrows():
-    c1, c2, c3, c4, c5, c6 = st.columns([3, 2, 2, 1.5, 2, 2])
-    bill_id = row.get("id")
-    name = row.get("card", "")
-    due = row.get("due_date", "")
-    amt = row.get("total_due", 0.0)
-    status = str(row.get("status", "")).lower()
-    pdf_path = row.get("pdf_path", "")
-
-    c1.write(name)
-    c2.write(str(due))
-    c3.write(_peso(float(amt)))
-    c4.write(status.capitalize() if status else "—")
-
-    # --- PDF button ---
-    if isinstance(pdf_path, str) and pdf_path:
-        if pdf_path.startswith(("http://", "https://")):
-            # open in new tab
-            c5.link_button("Open PDF", pdf_path, key=f"pdf_link_{bill_id}")
-        else:
-            # local file -> download button
-            try:
-                with open(pdf_path, "rb") as f:
-                    c5.download_button(
-                        "Download PDF",
-                        data=f,
-                        file_name=os.path.basename(pdf_path),
-                        key=f"pdf_dl_{bill_id}",
-                    )
-            except Exception as e:
-                c5.error("PDF not found")
-
-    # --- Pay button (calls API) ---
-    disabled = status == "paid"
-    c6.button(
-        "Paid" if disabled else "Pay",
-        key=f"pay_{bill_id}",
-        disabled=disabled,
-        on_click=_queue_pay,
-        args=(bill_id, disabled),
-        use_container_width=True,
-    )
 
-# ---------- Handle queued payment once, after rendering ----------
-paying_id = st.session_state.get("paying_id")
-if paying_id and not st.session_state.get("pay_inflight"):
-    st.session_state["pay_inflight"] = True
-    with st.spinner(f"Processing payment for {paying_id}..."):
-        try:
-            # Choose ONE style. Example below assumes RESTful:
-            # settings.API should be the /bills base, e.g., https://api.example.com/bills
-            resp = requests.post(
-                f"{settings.API}/{paying_id}/pay",
-                timeout=30,
-            )
-            if resp.ok:
-                st.success(f"Bill {paying_id} marked as paid.")
-                # Clear queued action so rerun doesn't repeat the call
-                st.session_state["paying_id"] = None
-                # If you repopulate 'cards_month' from API, you can allow natural rerun.
-                # If you need an immediate refresh of cached data, uncomment:
-                # st.rerun()
+
+@st.fragment
+def bills_panel(cards_month: pd.DataFrame) -> None:
+    """Bills table and Pay handling; a click here reruns only this fragment, not the whole report."""
+    st.markdown("### Bills")
+    header = st.columns([3, 2, 2, 1.5, 2, 2])
+    header[0].markdown("**Name**")
+    header[1].markdown("**Due Date**")
+    header[2].markdown("**Amount**")
+    header[3].markdown("**Status**")
+    header[4].markdown("**PDF**")
+    header[5].markdown("**Action**")
+
+    # Pull the displayed columns out once instead of building a Series per row
+    ids = cards_month["id"].to_list()
+    names = cards_month["card"].to_list()
+    dues = cards_month["due_date"].dt.strftime("%Y-%m-%d").fillna("—").to_list()
+    amts_str = cards_month["total_due"].map(lambda x: "—" if pd.isna(x) else f"₱{x:,.2f}").to_list()
+    stats = cards_month["status"].fillna("").astype(str).str.lower().to_list()
+    pdfs = cards_month["pdf_path"].fillna("").to_list()
+
+    for i, bill_id in enumerate(ids):
+        c1, c2, c3, c4, c5, c6 = st.columns([3, 2, 2, 1.5, 2, 2])
+        status = stats[i]
+        pdf_path = pdfs[i]
+
+        c1.write(names[i])
+        c2.write(dues[i])
+        c3.write(amts_str[i])
+        c4.write(status.capitalize() if status else "—")
+
+        # --- PDF button ---
+        if isinstance(pdf_path, str) and pdf_path:
+            if pdf_path.startswith(("http://", "https://")):
+                # open in new tab
+                c5.link_button("Open PDF", pdf_path, key=f"pdf_link_{bill_id}")
             else:
-                st.error(f"Payment failed: {resp.status_code} {resp.text}")
+                # local file -> download button
+                try:
+                    with open(pdf_path, "rb") as f:
+                        c5.download_button(
+                            "Download PDF",
+                            data=f,
+                            file_name=os.path.basename(pdf_path),
+                            key=f"pdf_dl_{bill_id}",
+                        )
+                except Exception as e:
+                    c5.error("PDF not found")
+
+        # --- Pay button (calls API) ---
+        disabled = status == "paid"
+        c6.button(
+            "Paid" if disabled else "Pay",
+            key=f"pay_{bill_id}",
+            disabled=disabled,
+            on_click=_queue_pay,
+            args=(bill_id, disabled),
+            use_container_width=True,
+        )
+
+    # ---------- Handle queued payment once, after rendering ----------
+    paying_id = st.session_state.get("paying_id")
+    if paying_id and not st.session_state.get("pay_inflight"):
+        st.session_state["pay_inflight"] = True
+        with st.spinner(f"Processing payment for {paying_id}..."):
+            try:
+                # Choose ONE style. Example below assumes RESTful:
+                # settings.API should be the /bills base, e.g., https://api.example.com/bills
+                resp = _session().post(
+                    f"{settings.API}/{paying_id}/pay",
+                    timeout=30,
+                )
+                if resp.ok:
+                    st.success(f"Bill {paying_id} marked as paid.")
+                    # Clear queued action so rerun doesn't repeat the call
+                    st.session_state["paying_id"] = None
+                    # Drop the cached payload/frames; the next rerun re-fetches the same URL
+                    fetch_bills.clear()
+                    transform_api_to_frames.clear()
+                    st.session_state["auto_fetch_done"] = False
+                    # If you need an immediate refresh, uncomment:
+                    # st.rerun()
+                else:
+                    st.error(f"Payment failed: {resp.status_code} {resp.text}")
+                    st.session_state["paying_id"] = None
+            except Exception as e:
+                st.error(f"Payment error: {e}")
                 st.session_state["paying_id"] = None
-        except Exception as e:
-            st.error(f"Payment error: {e}")
-            st.session_state["paying_id"] = None
-        finally:
-            st.session_state["pay_inflight"] = False
+            finally:
+                st.session_state["pay_inflight"] = False
+
+
+bills_panel(cards_month)
 
 # -----------------------------
 # 3) Utilities & Subscriptions (if any)
@@ -411,7 +488,13 @@ if utils_month.empty:
     st.info("No utilities/subscriptions found in this API response.")
 else:
     utils_view = utils_month.copy()
-    utils_view["bill_period"] = utils_view.apply(lambda r: f"{r.get('bill_period_start')} – {r.get('bill_period_end')}", axis=1)
+    utils_view["bill_period"] = (
+        utils_view["bill_period_start"].dt.strftime("%Y-%m-%d").fillna("")
+        + " – "
+        + utils_view["bill_period_end"].dt.strftime("%Y-%m-%d").fillna("")
+    )
+    for c in ["due_date", "paid_date"]:
+        utils_view[c] = utils_view[c].dt.date
     utils_cols = ["provider","bill_period","due_date","amount","status","paid_date","method","remarks","pdf_path"]
     st.dataframe(
         utils_view[[c for c in utils_cols if c in utils_view.columns]]
@@ -424,14 +507,10 @@ else:
 # 4) Upcoming & Overdue Alerts
 # -----------------------------
 st.subheader("4) Upcoming & Overdue Alerts")
-_today = date.today()
-alerts_cc = cards_month[["card","due_date","total_due"]].rename(columns={"card":"bill","total_due":"amount"}) if not cards_month.empty else pd.DataFrame(columns=["bill","due_date","amount"]) 
-alerts_ut = utils_month[["provider","due_date","amount"]].rename(columns={"provider":"bill"}) if not utils_month.empty else pd.DataFrame(columns=["bill","due_date","amount"]) 
-alerts = pd.concat([alerts_cc, alerts_ut], ignore_index=True)
+alerts = alerts_m.loc[alerts_m["_period"].eq(sel_month).fillna(False)].drop(columns="_period")
 if not alerts.empty:
-    alerts["days_left"] = alerts["due_date"].apply(lambda d: (pd.to_datetime(d).date() - _today).days if pd.notna(d) else np.nan)
-    alerts["status"] = np.where(alerts["days_left"] < 0, "Overdue", np.where(alerts["days_left"] <= 7, "Due soon", "Pending"))
     alerts = alerts.sort_values(["status","days_left"], ascending=[True, True])
+    alerts["due_date"] = alerts["due_date"].dt.date
     st.dataframe(alerts.rename(columns={"bill":"Bill","due_date":"Due Date","amount":"Amount","days_left":"Days Left","status":"Status"}), width='stretch', hide_index=True)
 else:
     st.info("No upcoming or overdue items for the selected month.")
@@ -478,7 +557,7 @@ else:
 st.subheader("6) Raw Extract (Appendix)")
 raw_show = raw_view.copy()
 if "sent_date" in raw_show:
-    raw_show["sent_date"] = pd.to_datetime(raw_show["sent_date"], errors="coerce").dt.date
+    raw_show["sent_date"] = raw_show["sent_date"].dt.date
 st.dataframe(
     raw_show.rename(columns={
         "name": "Name",
@@ -498,50 +577,70 @@ st.dataframe(
 st.markdown("---")
 st.subheader("Export Report")
 
-def _build_excel(cards: pd.DataFrame, utils: pd.DataFrame, alerts: pd.DataFrame, raw: pd.DataFrame, hist: pd.DataFrame, sel_month: str) -> bytes:
+_PESO_COLS = {"total_due", "min_due", "amount_paid", "remaining_balance", "amount", "credit_cards", "utilities", "total"}
+
+
+def _write_sheet(wb: "xlsxwriter.Workbook", name: str, df: Optional[pd.DataFrame], peso_fmt, date_fmt) -> None:
+    """Write a DataFrame to a new sheet row by row (constant_memory needs rows in order)."""
+    ws = wb.add_worksheet(name)
+    if df is None or len(df.columns) == 0:
+        return
+    # xlsxwriter rejects tz-aware datetimes; write those as naive local time
+    tz_cols = [c for c in df.columns if isinstance(df[c].dtype, pd.DatetimeTZDtype)]
+    if tz_cols:
+        df = df.assign(**{c: df[c].dt.tz_convert(_LOCAL_TZ).dt.tz_localize(None) for c in tz_cols})
+    for j, col in enumerate(df.columns):
+        if col in _PESO_COLS:
+            ws.set_column(j, j, 16, peso_fmt)
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            ws.set_column(j, j, 12, date_fmt)
+    ws.write_row(0, 0, [str(c) for c in df.columns])
+    # object values with NaN/NaT/NA as None, which xlsxwriter writes as blank cells
+    values = df.astype(object).where(df.notna(), None)
+    for r, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        ws.write_row(r, 0, row)
+
+
+@st.cache_data(show_spinner=False)
+def _build_excel(cards: pd.DataFrame, utils: pd.DataFrame, alerts: pd.DataFrame, raw: pd.DataFrame, hist: pd.DataFrame, sel_month: str,
+                 summary_values: tuple[float, float, float, float]) -> bytes:
+    """Render the XLSX report; cached on its inputs so reruns don't rebuild the workbook."""
+    import xlsxwriter
+
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        # Summary
-        summary_df = pd.DataFrame({
-            "Metric": [
-                "Total Bills Paid (This Month)",
-                "Credit Card Total Due",
-                "Utilities Total Due",
-                "Upcoming Due (7 days)",
-            ],
-            "Value": [this_month_paid, credit_total_due, utilities_total_due, upcoming_7],
-        })
-        summary_df.to_excel(writer, sheet_name="Summary", index=False)
-
-        # Sheets
-        cards.to_excel(writer, sheet_name="CreditCards", index=False)
-        (utils if utils is not None else pd.DataFrame()).to_excel(writer, sheet_name="Utilities", index=False)
-        (alerts if alerts is not None else pd.DataFrame()).to_excel(writer, sheet_name="Alerts", index=False)
-        raw.to_excel(writer, sheet_name="RawExtract", index=False)
-        (hist if hist is not None else pd.DataFrame()).to_excel(writer, sheet_name="History", index=False)
-
-        # Basic formatting
-        wb = writer.book
-        peso_fmt = wb.add_format({"num_format": "₱#,##0.00"})
-        try:
-            ws = writer.sheets["Summary"]
-            ws.set_column("A:A", 35)
-            ws.set_column("B:B", 22, peso_fmt)
-        except Exception:
-            pass
-    output.seek(0)
-    return output.read()
-
-# Build Alerts df for export scope
-_today = date.today()
-alerts_cc_all = cards_m[["card","due_date","total_due"]].rename(columns={"card":"bill","total_due":"amount"}) if not cards_m.empty else pd.DataFrame(columns=["bill","due_date","amount"]) 
-alerts_ut_all = utils_m[["provider","due_date","amount"]].rename(columns={"provider":"bill"}) if not utils_m.empty else pd.DataFrame(columns=["bill","due_date","amount"]) 
-alerts_all = pd.concat([alerts_cc_all, alerts_ut_all], ignore_index=True)
-if not alerts_all.empty:
-    alerts_all["days_left"] = alerts_all["due_date"].apply(lambda d: (pd.to_datetime(d).date() - _today).days if pd.notna(d) else np.nan)
-    alerts_all["status"] = np.where(alerts_all["days_left"] < 0, "Overdue", np.where(alerts_all["days_left"] <= 7, "Due soon", "Pending"))
-
-excel_bytes = _build_excel(cards_month, utils_month, alerts_all, raw_view, hist, sel_month)
+    # constant_memory flushes each row as it is written instead of holding every sheet's cells
+    wb = xlsxwriter.Workbook(output, {"constant_memory": True})
+    peso_fmt = wb.add_format({"num_format": "₱#,##0.00"})
+    date_fmt = wb.add_format({"num_format": "yyyy-mm-dd"})
+
+    # Summary
+    ws = wb.add_worksheet("Summary")
+    ws.set_column("A:A", 35)
+    ws.set_column("B:B", 22, peso_fmt)
+    ws.write_row(0, 0, ["Metric", "Value"])
+    metrics = [
+        "Total Bills Paid (This Month)",
+        "Credit Card Total Due",
+        "Utilities Total Due",
+        "Upcoming Due (7 days)",
+    ]
+    for r, (metric, value) in enumerate(zip(metrics, summary_values), start=1):
+        ws.write_row(r, 0, [metric, value])
+
+    # Sheets
+    _write_sheet(wb, "CreditCards", cards, peso_fmt, date_fmt)
+    _write_sheet(wb, "Utilities", utils, peso_fmt, date_fmt)
+    _write_sheet(wb, "Alerts", alerts, peso_fmt, date_fmt)
+    _write_sheet(wb, "RawExtract", raw, peso_fmt, date_fmt)
+    _write_sheet(wb, "History", hist, peso_fmt, date_fmt)
+
+    wb.close()
+    return output.getvalue()
+
+excel_bytes = _build_excel(
+    cards_month.drop(columns=["_period", "_is_paid"]), utils_month.drop(columns=["_period", "_is_paid"]), alerts_m.drop(columns="_period"), raw_view, hist, sel_month,
+    (float(this_month_paid), float(credit_total_due), float(utilities_total_due), float(upcoming_7)),
+)
 st.download_button(
     label="⬇️ Download XLSX",
     data=excel_bytes,
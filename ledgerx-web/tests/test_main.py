@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+APP = str(Path(__file__).resolve().parent.parent / "main.py")
+
+# Shaped like /get_bills: due_date is TEXT, sent_date/paid_at come from TIMESTAMPTZ columns
+PAYLOAD = {
+    "status": "Success",
+    "bills": [
+        {
+            "id": 1, "name": "BPI Rewards", "category": "credit_card", "status": "paid",
+            "due_date": "2025-09-17", "amount": "37265.35",
+            "sent_date": "2025-09-01T08:30:00+08:00", "paid_at": "2025-09-18T10:15:00+08:00",
+        },
+        {
+            "id": 2, "name": "HSBC Gold Visa", "category": "credit_card", "status": "unpaid",
+            "due_date": "2025-09-25", "amount": "5617.13",
+            "sent_date": "2025-09-05T01:00:00+00:00", "paid_at": None,
+        },
+        {
+            "id": 3, "name": "Meralco", "category": "utility", "status": "paid",
+            "due_date": "2025-09-20", "amount": "2450.00",
+            "sent_date": "2025-09-02T09:00:00+08:00", "paid_at": "2025-09-21T09:00:00+08:00",
+        },
+    ],
+}
+
+
+def _run_with(payload: dict) -> AppTest:
+    at = AppTest.from_file(APP, default_timeout=30).run()
+    at.text_area[0].set_value(json.dumps(payload)).run()
+    return at
+
+
+def test_offset_timestamps_render_delays_and_export():
+    # the XLSX export is built on every run, so a clean run also covers _build_excel
+    at = _run_with(PAYLOAD)
+    assert not at.exception
+    # avg delay subtracts paid_at (offset-aware in the payload) from due_date (naive);
+    # both bills paid a day late
+    avg_delay = next(m for m in at.metric if m.label == "Avg Delay (days)")
+    assert avg_delay.value == "1.0"
+
+
+def test_mixed_iso_shapes_share_local_months():
+    # Z, +08:00 and date-only values all land in Manila-local months
+    bills = [
+        {"id": 1, "name": "BPI Rewards", "category": "credit_card", "status": "unpaid",
+         "due_date": "2025-10-20", "amount": "100", "sent_date": "2025-09-30T20:00:00Z"},
+        {"id": 2, "name": "HSBC Gold Visa", "category": "credit_card", "status": "unpaid",
+         "due_date": "2025-10-15", "amount": "200", "sent_date": "2025-09-30 23:30:00+08:00"},
+        {"id": 3, "name": "Metrobank", "category": "credit_card", "status": "unpaid",
+         "due_date": "2025-09-05", "amount": "300", "sent_date": "2025-08-15"},
+    ]
+    at = _run_with({"status": "Success", "bills": bills})
+    assert not at.exception
+    assert at.selectbox[0].options == ["2025-08", "2025-09", "2025-10"]
+
+
+def _load(*names: str) -> dict:
+    """Exec selected top-level definitions from main.py without running the page."""
+    import ast
+    from typing import Optional
+
+    import pandas as pd
+
+    tree = ast.parse(Path(APP).read_text(encoding="utf-8"))
+    wanted = [
+        node for node in tree.body
+        if (isinstance(node, ast.FunctionDef) and node.name in names)
+        or (isinstance(node, ast.Assign) and any(getattr(t, "id", None) in names for t in node.targets))
+    ]
+    ns = {"pd": pd, "Optional": Optional}
+    exec(compile(ast.Module(body=wanted, type_ignores=[]), APP, "exec"), ns)
+    return ns
+
+
+def test_write_sheet_accepts_tz_aware_columns():
+    import io
+
+    import pandas as pd
+    import xlsxwriter
+
+    ns = _load("_write_sheet", "_PESO_COLS", "_LOCAL_TZ")
+    df = pd.DataFrame({
+        "card": ["BPI Rewards", "HSBC Gold Visa"],
+        "payment_date": pd.to_datetime(["2025-09-18T02:15:00Z", None], utc=True),
+        "total_due": [37265.35, 5617.13],
+    })
+    wb = xlsxwriter.Workbook(io.BytesIO(), {"constant_memory": True})
+    ns["_write_sheet"](wb, "CreditCards", df, wb.add_format(), wb.add_format())
+    wb.close()
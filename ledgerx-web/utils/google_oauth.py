@@ -1,17 +1,77 @@
 # utils/google_oauth.py
 from __future__ import annotations
+import atexit
+import hashlib
+import re
+import threading
+import time
 import requests
-from typing import Dict, Tuple
+from requests.adapters import HTTPAdapter
+from typing import TYPE_CHECKING, Dict, Tuple
+from urllib.parse import quote, urlencode
 import streamlit as st
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
+from urllib3.util.retry import Retry
 from config import settings
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional
+    from json import loads as json_loads
+
+# google-auth / requests-oauthlib pull in cryptography and friends; they are imported on
+# first use so page views of signed-in users don't pay for them at startup
+if TYPE_CHECKING:
+    from google_auth_oauthlib.flow import Flow
+
 # ---- Load config from st.secrets ----
 CLIENT_CONFIG = settings.GOOGLE_OAUTH
 CONF = CLIENT_CONFIG.get("web", {})
+_SCOPES = tuple(CONF.get("scopes", ["openid", "https://www.googleapis.com/auth/userinfo.profile", "https://www.googleapis.com/auth/userinfo.email"]))
+_CLIENT_ID = CONF["client_id"]
+
+# userinfo responses keyed by sha256(access token), so raw tokens are never kept in memory
+_USERINFO_TTL = 300  # seconds
+_USERINFO_MAXSIZE = 10_000
+_userinfo_cache: Dict[str, Tuple[float, dict]] = {}
+_userinfo_lock = threading.Lock()
+
+# One pooled adapter for every call to Google (userinfo, ID-token certs, token exchange),
+# so the keep-alive TLS connections are reused across logins
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+)
+_SESSION = requests.Session()
+_SESSION.mount("https://", _ADAPTER)
+
+# With httpx[http2] installed, the GETs to googleapis.com (userinfo, certs) share one
+# multiplexed HTTP/2 connection; otherwise they use the pooled requests session above.
+# The token exchange always goes through requests-oauthlib.
+try:
+    import httpx
+    _HTTP = httpx.Client(
+        http2=True,  # raises ImportError when the h2 extra is missing
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+    )
+    atexit.register(_HTTP.close)
+except ImportError:  # httpx is optional
+    _HTTP = _SESSION
+
+# Google's ID-token signing certs (PEM by key id), held until the response's max-age runs out
+_GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+_GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+_CERTS_DEFAULT_TTL = 3600  # seconds, when Cache-Control carries no max-age
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+_certs_cache: Tuple[float, Dict[str, str]] | None = None
+_certs_lock = threading.Lock()
+
+# Query parameters Google's OAuth callback can carry; anything else is dropped before fetch_token
+_CALLBACK_PARAMS = frozenset({"code", "state", "scope", "authuser", "hd", "prompt", "error", "iss"})
+
+# Profile fields copied into the session user; taken from the ID token when it has them all
+_PROFILE_CLAIMS = ("email", "name", "picture", "email_verified")
 
 # -------- Helpers (stateless) --------
 def get_redirect_uri() -> str:
@@ -24,11 +84,16 @@ def get_redirect_uri() -> str:
 
 def build_flow(redirect_uri: str) -> Flow:
     """Create a Google OAuth flow instance."""
-    return Flow.from_client_config(
+    from google_auth_oauthlib.flow import Flow
+
+    flow = Flow.from_client_config(
         client_config=CLIENT_CONFIG,
-        scopes=CONF.get("scopes", ["openid", "https://www.googleapis.com/auth/userinfo.profile", "https://www.googleapis.com/auth/userinfo.email"]),
+        scopes=list(_SCOPES),
         redirect_uri=redirect_uri,
     )
+    # the token exchange goes through requests-oauthlib's session; give it the shared pool
+    flow.oauth2session.mount("https://", _ADAPTER)
+    return flow
 
 
 def get_auth_url() -> Tuple[str, str]:
@@ -55,31 +120,32 @@ def exchange_code_for_tokens(query_params: Dict[str, list]) -> Tuple[dict, dict]
     flow = build_flow(redirect_uri)
 
     # Rebuild the current URL Google redirected to (must match exactly)
-    pairs = []
-    for k, v in query_params.items():
-        for item in v:
-            pairs.append(f"{k}={item}")
-    current_url = f"{redirect_uri}?{'&'.join(pairs)}" if pairs else redirect_uri
+    # (urlencode percent-encodes values, so a code containing '/', '+' or '=' survives the round trip)
+    params = {k: v for k, v in query_params.items() if k in _CALLBACK_PARAMS}
+    qs = urlencode(params, doseq=True, quote_via=quote)
+    current_url = f"{redirect_uri}?{qs}" if qs else redirect_uri
 
     # Fetch tokens
     flow.fetch_token(authorization_response=current_url)
     creds = flow.credentials
+    # Credentials always exposes these (possibly None); read each property once
+    token, refresh_token, raw_id_token = creds.token, creds.refresh_token, creds.id_token
 
-    # Optional: verify ID token’s signature, exp, and audience
-    idinfo = {}
-    if creds.id_token:
-        request = google_requests.Request()
-        idinfo = id_token.verify_oauth2_token(
-            creds.id_token, request, audience=CLIENT_CONFIG["web"]["client_id"]
-        )
+    # Optional: verify ID token’s signature, exp, and audience (local once the certs are cached)
+    idinfo = _verify_id_token(raw_id_token, _CLIENT_ID) if raw_id_token else {}
 
-    # OIDC userinfo profile
-    userinfo = _fetch_userinfo(creds.token)
+    # OIDC userinfo profile; with the profile+email scopes the ID token already carries
+    # every field we keep, so the userinfo round trip is only made when one is missing.
+    # The claims are as of sign-in, which is as fresh as userinfo would be at this point.
+    if all(k in idinfo for k in _PROFILE_CLAIMS):
+        userinfo = idinfo
+    else:
+        userinfo = _fetch_userinfo(token)
 
     credentials = {
-        "token": creds.token,
-        "refresh_token": getattr(creds, "refresh_token", None),
-        "id_token": getattr(creds, "id_token", None),
+        "token": token,
+        "refresh_token": refresh_token,
+        "id_token": raw_id_token,
         "token_uri": creds.token_uri,
         "client_id": creds.client_id,
         "client_secret": CONF["client_secret"],
@@ -95,14 +161,76 @@ def exchange_code_for_tokens(query_params: Dict[str, list]) -> Tuple[dict, dict]
     return credentials, user
 
 
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
 def _fetch_userinfo(access_token: str) -> dict:
-    r = requests.get(
+    """GET the OIDC userinfo, served from a short TTL cache per access token."""
+    key = _token_key(access_token)
+    with _userinfo_lock:
+        hit = _userinfo_cache.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            return hit[1]
+
+    r = _HTTP.get(
         "https://www.googleapis.com/oauth2/v3/userinfo",
         headers={"Authorization": f"Bearer {access_token}"},
         timeout=10,
     )
-    r.raise_for_status()
-    return r.json()
+    r.raise_for_status()  # errors are never cached
+    info = json_loads(r.content)
+
+    with _userinfo_lock:
+        now = time.monotonic()
+        if len(_userinfo_cache) >= _USERINFO_MAXSIZE:
+            for k in [k for k, (exp, _) in _userinfo_cache.items() if exp <= now]:
+                del _userinfo_cache[k]
+            if len(_userinfo_cache) >= _USERINFO_MAXSIZE:
+                del _userinfo_cache[next(iter(_userinfo_cache))]  # oldest insert
+        _userinfo_cache[key] = (now + _USERINFO_TTL, info)
+    return info
+
+
+def _google_certs(force: bool = False) -> Dict[str, str]:
+    """Google's signing certs, fetched at most once per Cache-Control max-age."""
+    global _certs_cache
+    with _certs_lock:
+        if not force and _certs_cache is not None and _certs_cache[0] > time.monotonic():
+            return _certs_cache[1]
+        r = _HTTP.get(_GOOGLE_CERTS_URL, timeout=10)
+        r.raise_for_status()
+        m = _MAX_AGE.search(r.headers.get("Cache-Control", ""))
+        ttl = int(m.group(1)) if m else _CERTS_DEFAULT_TTL
+        certs = json_loads(r.content)
+        _certs_cache = (time.monotonic() + ttl, certs)
+        return certs
+
+
+def _verify_id_token(token: str, audience: str) -> dict:
+    """
+    Same checks as id_token.verify_oauth2_token (signature, exp, audience, issuer),
+    but against the cached certs instead of fetching them on every login.
+    """
+    from google.auth import exceptions as google_exceptions
+    from google.auth import jwt
+
+    try:
+        idinfo = jwt.decode(token, certs=_google_certs(), audience=audience)
+    except ValueError:
+        # Google may have rotated its keys since the certs were cached; retry once with fresh ones
+        idinfo = jwt.decode(token, certs=_google_certs(force=True), audience=audience)
+    if idinfo.get("iss") not in _GOOGLE_ISSUERS:
+        raise google_exceptions.GoogleAuthError(
+            f"Wrong issuer. 'iss' should be one of the following: {_GOOGLE_ISSUERS}"
+        )
+    return idinfo
+
+
+def invalidate(access_token: str) -> None:
+    """Drop the cached userinfo for this access token (e.g. on logout)."""
+    with _userinfo_lock:
+        _userinfo_cache.pop(_token_key(access_token), None)
 
 
 # -------- Session utilities (stateful) --------
@@ -112,7 +240,12 @@ def is_signed_in() -> bool:
 
 def start_login() -> None:
     """Start the OAuth flow and render the login button."""
-    auth_url, state = get_auth_url()
+    if is_signed_in():
+        return
+    # Build the flow/URL once per session; reruns reuse the same URL and state
+    if "_auth_url" not in st.session_state:
+        st.session_state["_auth_url"] = get_auth_url()
+    auth_url, state = st.session_state["_auth_url"]
     st.session_state["state"] = state
     st.write("Please sign in with your Google account to continue.")
     st.link_button("Sign in with Google", auth_url)
@@ -123,22 +256,32 @@ def complete_login(query_params: Dict[str, list]) -> None:
     Handle the callback (with ?code & ?state), exchange token,
     and persist session. Displays errors inline on failure.
     """
-    if "state" not in st.session_state:
+    if is_signed_in():
+        return
+
+    # one read each from session state and the query params
+    state_sess = st.session_state.get("state")
+    state_param = (query_params.get("state") or [None])[0]
+    code_param = (query_params.get("code") or [None])[0]
+
+    if state_sess is None:
         st.error("Missing login state. Please start again.")
         return
 
-    if "state" not in query_params or "code" not in query_params:
+    if not (state_param and code_param):
         st.error("Invalid callback parameters.")
         return
 
-    if query_params["state"][0] != st.session_state["state"]:
+    if state_param != state_sess:
         st.error("State mismatch. Please try signing in again.")
         return
 
     try:
-        creds, user = exchange_code_for_tokens(query_params)
+        with st.spinner("Signing you in…"):
+            creds, user = exchange_code_for_tokens(query_params)
         st.session_state["credentials"] = creds
         st.session_state["user"] = user
+        st.session_state.pop("_auth_url", None)
         # Clean URL
         st.experimental_set_query_params()
         st.rerun()
@@ -147,6 +290,9 @@ def complete_login(query_params: Dict[str, list]) -> None:
 
 
 def logout() -> None:
-    for k in ["credentials", "user", "state"]:
+    creds = st.session_state.get("credentials")
+    if creds and creds.get("token"):
+        invalidate(creds["token"])
+    for k in ["credentials", "user", "state", "_auth_url"]:
         st.session_state.pop(k, None)
     st.experimental_set_query_params()